@@ -10,7 +10,8 @@ from langchain_community.document_loaders import PyMuPDFLoader
 from langchain.text_splitter import CharacterTextSplitter
 import requests
 import logging
-from utils import full_text_cleanup
+from utils import fast_text_cleanup
+from extraction import extract_document_text
 from groq import Groq
 import fitz
 from io import BytesIO
@@ -49,7 +50,7 @@ def extract_text_langchain(pdf_path):
 
 
 def lang_clean_text(text):
-    text = full_text_cleanup(text)
+    text = fast_text_cleanup(text)
     text_splitter = CharacterTextSplitter(chunk_size=100, chunk_overlap=20)
     return text_splitter.split_text(text)
 
@@ -91,11 +92,7 @@ def create_resources_from_bytes(pdf_stream):
     """Modified version of create_resources to work with BytesIO instead of file path"""
     
     try:
-        doc = fitz.open(stream=pdf_stream)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
+        text = extract_document_text(pdf_stream)
         
         if not text.strip():
             logging.error("No text extracted from PDF")
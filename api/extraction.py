@@ -0,0 +1,95 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz
+
+# Documents with fewer pages than this are parsed on the calling thread,
+# spinning up a process pool costs more than it saves for short handouts
+PARALLEL_MIN_PAGES = 32
+PAGES_PER_TASK = 16
+
+# Each pool worker opens the shared bytes once and keeps the handle around
+_worker_doc = None
+
+
+def _init_worker(pdf_bytes):
+    global _worker_doc
+    _worker_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+
+def _extract_range(start, stop):
+    """Extract pages [start, stop) from the worker's document."""
+    pages = []
+    for page_number in range(start, stop):
+        started = time.perf_counter()
+        text = _worker_doc[page_number].get_text()
+        pages.append({
+            "page_number": page_number + 1,
+            "text": text,
+            "elapsed": time.perf_counter() - started,
+        })
+    return pages
+
+
+def _extract_serial(doc):
+    for page_number, page in enumerate(doc):
+        started = time.perf_counter()
+        text = page.get_text()
+        yield {
+            "page_number": page_number + 1,
+            "text": text,
+            "elapsed": time.perf_counter() - started,
+        }
+
+
+def extract_pages(pdf_bytes, max_workers=None, pages_per_task=PAGES_PER_TASK):
+    """
+    Yield {"page_number", "text", "elapsed"} for every page of a PDF, in page order.
+
+    Large documents are split into page ranges and parsed by a process pool, each
+    worker reopening the same bytes. Pages are yielded as soon as their range is
+    done so callers can start cleaning/chunking before the last page is parsed.
+    """
+    if hasattr(pdf_bytes, "getvalue"):
+        pdf_bytes = pdf_bytes.getvalue()
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_MIN_PAGES or max_workers == 1:
+            yield from _extract_serial(doc)
+            return
+
+    max_workers = max_workers or min(os.cpu_count() or 1, 4)
+    ranges = [(start, min(start + pages_per_task, page_count))
+              for start in range(0, page_count, pages_per_task)]
+
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_worker,
+                             initargs=(pdf_bytes,)) as pool:
+        futures = [pool.submit(_extract_range, start, stop) for start, stop in ranges]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            # Generator closed early (or failed) - don't wait on pages nobody wants
+            for future in futures:
+                future.cancel()
+
+
+def extract_document_text(pdf_bytes, **kwargs):
+    """Extract the whole document as one string, logging per-page timing."""
+    started = time.perf_counter()
+    texts = []
+    slowest = None
+    for page in extract_pages(pdf_bytes, **kwargs):
+        texts.append(page["text"])
+        if slowest is None or page["elapsed"] > slowest["elapsed"]:
+            slowest = page
+    if slowest:
+        logging.info(
+            f"Extracted {len(texts)} pages in {time.perf_counter() - started:.2f}s "
+            f"(slowest page {slowest['page_number']}: {slowest['elapsed'] * 1000:.1f}ms)"
+        )
+    return "".join(texts)
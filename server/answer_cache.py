@@ -0,0 +1,126 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+SIMILARITY_THRESHOLD = 0.92
+TTL_SECONDS = 7 * 24 * 3600
+MAX_ENTRIES = 5000
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_TRAILING_PUNCT_RE = re.compile(r'[?.!\s]+$')
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return _TRAILING_PUNCT_RE.sub('', _WHITESPACE_RE.sub(' ', query.lower()).strip())
+
+
+class AnswerCache:
+    """
+    Answers keyed by (collection, query embedding), stored in SQLite.
+
+    A new query reuses a stored answer for the same collection when the
+    cosine similarity of the (unit-normalised) embeddings is at least
+    threshold. Entries expire after ttl seconds and the least recently used
+    ones are evicted past max_entries.
+    """
+
+    def __init__(self, db_path, threshold=SIMILARITY_THRESHOLD, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY,
+                collection_name TEXT NOT NULL,
+                query TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                elapsed REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_collection ON answers (collection_name, created_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        self._db.commit()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "seconds_saved": 0.0,
+        }
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, collection_name, embedding):
+        """Return the cached answer for a similar query, or None."""
+        vector = self._unit(embedding)
+        now = time.time()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, embedding, answer, elapsed FROM answers WHERE collection_name = ? AND created_at > ?",
+                (collection_name, now - self.ttl),
+            ).fetchall()
+
+            best = None
+            if rows:
+                matrix = np.frombuffer(b"".join(row[1] for row in rows), dtype=np.float32)
+                scores = matrix.reshape(len(rows), -1) @ vector
+                index = int(np.argmax(scores))
+                if scores[index] >= self.threshold:
+                    best = rows[index]
+
+            if best is None:
+                self.stats["misses"] += 1
+                return None
+
+            self._db.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, best[0]))
+            self._db.commit()
+            self.stats["hits"] += 1
+            self.stats["seconds_saved"] += best[3]
+            return best[2]
+
+    def store(self, collection_name, query, embedding, answer, elapsed):
+        """Remember answer; elapsed is how long it took to generate."""
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT INTO answers (collection_name, query, embedding, answer, elapsed, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (collection_name, query, self._unit(embedding).tobytes(), answer, elapsed, now, now),
+                )
+                self._db.execute("DELETE FROM answers WHERE created_at <= ?", (now - self.ttl,))
+                self._db.execute(
+                    "DELETE FROM answers WHERE id IN ("
+                    "SELECT id FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error storing cached answer: {str(e)}")
+
+    def invalidate(self, collection_name):
+        """Forget every answer for a collection whose content has changed."""
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM answers WHERE collection_name = ?", (collection_name,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error invalidating cached answers: {str(e)}")
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
@@ -1,19 +1,34 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os 
-import chromadb
 from dotenv import load_dotenv
 import re
 import uuid
+import hashlib
 import unicodedata
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain.text_splitter import CharacterTextSplitter
-import requests
 import logging
-from utils import full_text_cleanup
-from groq import Groq
-import fitz
+import json
+from utils import fast_text_cleanup, iter_cleaned_pages
+from extraction import extract_pages, extract_document_text, count_pages, log_extraction
+from chunker import iter_chunks, iter_sentences, estimate_tokens, split_on_separator
+from context_builder import budget_for, build_context, record_prompt, prompt_stats
+from registry import CollectionRegistry
+from lifecycle import CollectionLifecycle, OWNER_METADATA, estimate_bytes
+from doc_cache import DocumentCache
+from answer_cache import AnswerCache, normalize_query
+from jobs import JobQueue
+from chat_history import ChatHistory, format_history
+from conversation import Conversations
+from embeddings import EmbeddingEngine, MODEL_NAME as EMBEDDING_MODEL_NAME
+from embedding_cache import EmbeddingCache
+from vector_store import create_vector_store
+from ingest_writer import IngestWriter, ingest_snapshot, record_ingest, with_chunk_ids
+from lexical_index import LexicalIndexBuilder, LexicalIndexStore, reciprocal_rank_fusion
+from reranker import Reranker
+from llm_clients import LLMClients
+from llm_router import LLMRouter, LLMUnavailable, MockProvider, Provider
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 import time
 
 # Initialize Flask app
@@ -26,35 +41,131 @@ load_dotenv()
 ALLOWED_EXTENSIONS = {'txt', 'pdf'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Chunk window for the vector store, in characters
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 1000))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', 200))
+
 CHROMADB_API_TOKEN = os.getenv('CHROMA_API_KEY')
 SAMBANOVA_API_KEY = os.getenv('SAMBANOVA_API_KEY')
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"),)
+GROQ_MODEL = os.getenv('GROQ_MODEL', "llama-3.3-70b-versatile")
+SAMBANOVA_MODEL = os.getenv('SAMBANOVA_MODEL', "Meta-Llama-3.3-70B-Instruct")
+# Pooled keep-alive clients for every LLM provider, shared by all requests
+llm_clients = LLMClients(
+    groq_api_key=os.environ.get("GROQ_API_KEY"),
+    sambanova_api_key=SAMBANOVA_API_KEY,
+    ollama_url=os.getenv('OLLAMA_URL', 'http://localhost:11434'),
+    timeout=float(os.getenv('LLM_TIMEOUT', 60)),
+    connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT', 5)),
+    max_retries=int(os.getenv('LLM_MAX_RETRIES', 2)),
+    max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', 100)),
+)
 
-# Initialize ChromaDB client
-# pip install chromadb
+os.makedirs(app.instance_path, exist_ok=True)
 
-import chromadb
-chroma_client = chromadb.HttpClient(
-  ssl=True,
+# Vector store: hosted Chroma by default; "chroma_persistent" or "local"
+# keep vectors on this machine and skip the network round-trip per query
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma_http')
+# Connected on first use, so importing the app never waits on the network
+chroma_client = create_vector_store(
+  VECTOR_BACKEND,
+  lazy=True,
   host='api.trychroma.com',
   tenant='c74d6ead-7a1a-4e7d-afbb-3dd8d548c5ed',
   database='eda-database',
-  headers={
-    'x-chroma-token':CHROMADB_API_TOKEN,
-  }
+  token=CHROMADB_API_TOKEN,
+  path=os.getenv('VECTOR_PATH', os.path.join(app.instance_path, 'vectors')),
+)
+
+collection_registry = CollectionRegistry(
+    chroma_client,
+    os.path.join(app.instance_path, 'registry.db'),
+    max_handles=int(os.getenv('COLLECTION_CACHE_SIZE', 128)),
+)
+
+def evict_collection(collection_name):
+    """Forget the documents in a collection and delete it (used by the lifecycle sweeper)."""
+    collection_registry.forget_collection(collection_name)
+    drop_collection(collection_name)
+
+# On-disk Chroma leaves segment directories behind when collections are
+# deleted; CHROMA_SEGMENTS_PATH points the sweeper at any such directory
+# (e.g. the old chroma_db/ at the repo root) whatever the backend
+CHROMA_SEGMENTS_PATH = os.getenv('CHROMA_SEGMENTS_PATH') or (
+    os.getenv('VECTOR_PATH', os.path.join(app.instance_path, 'vectors'))
+    if VECTOR_BACKEND == 'chroma_persistent' else None
+)
+
+# Tracks when collections were created and last searched, and deletes
+# expired, over-quota and orphaned ones in the background
+collection_lifecycle = CollectionLifecycle(
+    os.path.join(app.instance_path, 'lifecycle.db'),
+    chroma_client,
+    evict_collection,
+    collection_registry.collections,
+    ttl=int(os.getenv('COLLECTION_TTL', 30 * 24 * 3600)),
+    quota_bytes=int(os.getenv('COLLECTION_QUOTA_BYTES', 0)),
+    sweep_interval=int(os.getenv('COLLECTION_SWEEP_INTERVAL', 600)),
+    persist_path=CHROMA_SEGMENTS_PATH,
+)
+# Conversation turns per session and document, read back into the prompt.
+# Kept in chat.db under the repo root's instance/ by default (created if
+# missing, and not tracked by git since every run migrates and writes it).
+CHAT_DB_PATH = os.getenv('CHAT_DB_PATH', os.path.join(os.path.dirname(app.root_path), 'instance', 'chat.db'))
+os.makedirs(os.path.dirname(CHAT_DB_PATH), exist_ok=True)
+chat_history = ChatHistory(
+    CHAT_DB_PATH,
+    window=int(os.getenv('HISTORY_MESSAGES', 6)),
+)
+HISTORY_TOKENS = int(os.getenv('HISTORY_TOKENS', 1000))
+# CONDENSE_MODE=llm asks the LLM to rewrite follow-ups; "rules" (default) costs no tokens
+CONDENSE_MODE = os.getenv('CONDENSE_MODE', 'rules')
+answer_cache = AnswerCache(
+    os.path.join(app.instance_path, 'answers.db'),
+    threshold=float(os.getenv('ANSWER_CACHE_THRESHOLD', 0.92)),
+    ttl=int(os.getenv('ANSWER_CACHE_TTL', 7 * 24 * 3600)),
+)
+# One model per worker, batching ingest and query embeddings together
+embedding_engine = EmbeddingEngine(
+    max_batch=int(os.getenv('EMBEDDING_BATCH', 64)),
+    max_wait=float(os.getenv('EMBEDDING_MAX_WAIT', 0.01)),
+    cache=EmbeddingCache(
+        os.path.join(app.instance_path, 'embeddings.db'),
+        EMBEDDING_MODEL_NAME,
+        max_bytes=int(os.getenv('EMBEDDING_CACHE_BYTES', 512 * 1024 * 1024)),
+    ),
+)
+lexical_indexes = LexicalIndexStore(os.path.join(app.instance_path, 'lexical'))
+# Candidates taken from each retriever before fusion
+RETRIEVAL_CANDIDATES = int(os.getenv('RETRIEVAL_CANDIDATES', 10))
+retrieval_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+# Over-fetch for the cross-encoder, which keeps the best CONTEXT_HITS.
+# Off unless RERANKER_MODEL is set (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2), since it
+# needs sentence-transformers, which requirements.txt doesn't install
+RERANK_CANDIDATES = int(os.getenv('RERANK_CANDIDATES', 40))
+CONTEXT_HITS = int(os.getenv('CONTEXT_HITS', 4))
+reranker = Reranker(
+    os.getenv('RERANKER_MODEL'),
+    budget=float(os.getenv('RERANK_BUDGET', 0.25)),
+) if os.getenv('RERANKER_MODEL') else None
+# Concurrent vector store writes per ingest (0 writes each batch inline)
+INGEST_MAX_IN_FLIGHT = int(os.getenv('INGEST_MAX_IN_FLIGHT', 3))
+# Stored chunk ids read per request when diffing a re-upload
+UPDATE_PAGE_SIZE = 1000
+document_cache = DocumentCache(
+    os.path.join(app.instance_path, 'documents'),
+    max_bytes=int(os.getenv('DOCUMENT_CACHE_BYTES', 64 * 1024 * 1024)),
 )
 
 
 def extract_text_langchain(pdf_path):
-    loader = PyMuPDFLoader(pdf_path)
-    documents = loader.load()
-    return "\n".join([doc.page_content for doc in documents])
+    # Same output as langchain's PyMuPDFLoader pages joined by newlines
+    with open(pdf_path, "rb") as f:
+        return extract_document_text(f.read(), separator="\n")
 
 
 def lang_clean_text(text):
-    text = full_text_cleanup(text)
-    text_splitter = CharacterTextSplitter(chunk_size=100, chunk_overlap=20)
-    return text_splitter.split_text(text)
+    text = fast_text_cleanup(text)
+    return split_on_separator(text, chunk_size=100, chunk_overlap=20)
 
 
 def split_text_into_sentences(text):
@@ -72,44 +183,20 @@ def create_resources(file_path):
     return lang_sentences
 
 
-# Global variable to store current collection info
-current_collection_name = None
-
-def get_or_create_collection():
-    """Get the current collection or create a new one with a unique name."""
-    global current_collection_name
-    
-    if not current_collection_name:
-        return None, None
-    
-    try:
-        # Try to get the existing collection
-        collection = chroma_client.get_collection(name=current_collection_name)
-        return collection, current_collection_name
-    except Exception as e:
-        logging.error(f"Error getting collection: {str(e)}")
+def get_or_create_collection(document_id):
+    """Get the collection for document_id."""
+    collection = collection_registry.get(document_id)
+    if collection is None:
         return None, None
+    collection_lifecycle.touch(collection.name)
+    return collection, collection.name
 
 def create_resources_from_bytes(pdf_stream):
     """Modified version of create_resources to work with BytesIO instead of file path"""
     
     try:
-        doc = fitz.open(stream=pdf_stream)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
-        
-        if not text.strip():
-            logging.error("No text extracted from PDF")
-            return []
-        
-        lang_cleaned_text = lang_clean_text(text)
-        if not lang_cleaned_text:
-            logging.error("No text after cleaning")
-            return []
-            
-        lang_sentences = split_text_into_sentences(lang_cleaned_text[0])
+        pages = iter_cleaned_pages(extract_pages(pdf_stream))
+        lang_sentences = [sentence for sentence, _ in iter_sentences(pages)]
         if not lang_sentences:
             logging.error("No sentences extracted")
             return []
@@ -119,81 +206,270 @@ def create_resources_from_bytes(pdf_stream):
         logging.error(f"Error in create_resources_from_bytes: {str(e)}")
         return []
 
+def create_chunks_from_bytes(pdf_stream, page_texts=None, on_page=None):
+    """
+    Stream bounded chunks ({"text", "chunk_index", "page_number", "page_end"})
+    out of a PDF while it is still being parsed. Cleaned page text is appended
+    to page_texts when a list is given, and on_page(pages_done) is called as
+    pages come out of the extractor.
+    """
+    pages = iter_cleaned_pages(log_extraction(extract_pages(pdf_stream)))
+    if page_texts is not None or on_page is not None:
+        pages = _remember_pages(pages, page_texts, on_page)
+    # Content-defined boundaries, so a re-uploaded revision mostly chunks
+    # the same way and only the changed chunks are embedded again
+    return iter_chunks(pages, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, content_defined=True)
+
+def _remember_pages(pages, page_texts, on_page):
+    for pages_done, page in enumerate(pages, 1):
+        if page_texts is not None and page["text"]:
+            page_texts.append(page["text"])
+        if on_page is not None:
+            on_page(pages_done)
+        yield page
+
 def generate_unique_collection_name(base_name):
     """Generate a unique collection name by adding timestamp and UUID."""
     timestamp = int(time.time())
     unique_id = str(uuid.uuid4())[:8]  # Use first 8 chars of UUID for brevity
     return f"{base_name}_{timestamp}_{unique_id}"
 
+def max_upsert_batch():
+    """Largest batch the vector store accepts in one write, when it tells us."""
+    try:
+        return chroma_client.get_max_batch_size()
+    except Exception:
+        return None
+
+def content_hash_for(file_bytes):
+    """Hash of the upload plus the chunking config, so identical PDFs share a collection."""
+    digest = hashlib.sha256(file_bytes)
+    digest.update(f"|{CHUNK_SIZE}|{CHUNK_OVERLAP}".encode())
+    return digest.hexdigest()
+
+def drop_collection(collection_name):
+    """Delete a collection from Chroma along with its cached text."""
+    try:
+        chroma_client.delete_collection(name=collection_name)
+        logging.info(f"Deleted collection: {collection_name}")
+    except Exception as e:
+        logging.error(f"Error deleting collection {collection_name}: {str(e)}")
+    document_cache.discard(collection_name)
+    lexical_indexes.discard(collection_name)
+    collection_lifecycle.forget(collection_name)
+
+def reuse_collection(fileID, content_hash):
+    """Attach fileID to an existing collection with the same content, if there is one."""
+    collection_name = collection_registry.find_content(content_hash)
+    if not collection_name:
+        return None
+    try:
+        collection = chroma_client.get_collection(name=collection_name)
+    except Exception as e:
+        logging.error(f"Error getting shared collection {collection_name}: {str(e)}")
+        return None
+
+    unused = collection_registry.register(fileID, collection, content_hash)
+    if unused:
+        drop_collection(unused)
+    collection_lifecycle.touch(collection_name)
+    logging.info(f"Reusing collection {collection_name} for document {fileID}")
+    return collection
+
+def open_for_update(fileID):
+    """
+    (collection, {chunk id: metadata}) for a re-upload of fileID whose
+    collection no other document shares, or (None, None).
+    """
+    collection_name = collection_registry.take_for_update(fileID)
+    if not collection_name:
+        return None, None
+    existing = {}
+    try:
+        collection = chroma_client.get_collection(name=collection_name)
+        # Paged, since hosted Chroma caps how many records one get() returns
+        while True:
+            page = collection.get(include=["metadatas"], limit=UPDATE_PAGE_SIZE, offset=len(existing))
+            if not page["ids"]:
+                break
+            existing.update(zip(page["ids"], page["metadatas"]))
+    except Exception as e:
+        logging.error(f"Error reading collection {collection_name} for update: {str(e)}")
+        return None, None
+    logging.info(f"Updating collection {collection_name} ({len(existing)} chunks) for document {fileID}")
+    return collection, existing
+
 def save_to_chromadb(file, fileID):
     """Save file to ChromaDB."""
-    try:
-        # Basic validations
-        if file.filename == '':
-            return {'error': 'No file selected'}, 400
-
-        filename = file.filename
-        # ...existing validation code...
-
-        # Create new collection with a guaranteed unique name
-        global current_collection_name
-        base_name = f"doc_{fileID}"
-        current_collection_name = generate_unique_collection_name(base_name)
-        print(f"New collection name: {current_collection_name}")
-        
-        try:
-            collection = chroma_client.create_collection(
-                name=current_collection_name
-            )
-            logging.info(f"Created new collection: {current_collection_name}")
-        except Exception as e:
-            logging.error(f"Error creating collection: {str(e)}")
-            return {'error': f'Failed to create new collection: {str(e)}'}, 500
+    # Basic validations
+    if file.filename == '':
+        return {'error': 'No file selected'}, 400
 
-        # Read file contents into memory
-        file_bytes = file.read()
-        
-        # Create a BytesIO object to work with PyMuPDF
-        pdf_stream = BytesIO(file_bytes)
-        
-        # Process the file and get resources
-        resources = create_resources_from_bytes(pdf_stream)
-        document = " ".join(resources)
-        
-        if not resources:
-            return {'error': 'No valid text content could be extracted'}, 400
+    return ingest_pdf(file.read(), file.filename, fileID)
 
-        # Add documents to collection in batches to avoid exceeding maximum batch size
-        try:
-            batch_size = 100
-            for i in range(0, len(resources), batch_size):
-                batch_docs = resources[i:i+batch_size]
-                batch_ids = [str(uuid.uuid4()) for _ in range(len(batch_docs))]
-                collection.add(
-                    documents=batch_docs,
-                    ids=batch_ids
-                )
-            
+def _no_progress(stage, **counters):
+    pass
+
+def ingest_pdf(file_bytes, filename, fileID, progress=_no_progress):
+    """
+    Extract, chunk and embed a PDF into a collection for fileID.
+    progress(stage, **counters) is told how far along it is.
+    """
+    started = time.perf_counter()
+    try:
+        progress("hashing")
+        content_hash = content_hash_for(file_bytes)
+
+        # Someone already uploaded this exact file - skip extraction and embedding
+        collection = reuse_collection(fileID, content_hash)
+        if collection is not None:
             return {
                 'message': 'File processed and uploaded successfully',
-                'documents_processed': len(resources),
-                'collection_id': current_collection_name,
+                'documents_processed': collection.count(),
+                'document_id': fileID,
+                'collection_id': collection.name,
                 'filename': filename,
-                "document": document
+                'deduplicated': True,
+                "document": get_document_text(collection)
             }, 200
-            
+
+        # A new version of a document we already hold: update its collection
+        # in place, embedding only the chunks that changed
+        collection, existing = open_for_update(fileID)
+        if collection is not None:
+            collection_name = collection.name
+        else:
+            # Create new collection with a guaranteed unique name
+            base_name = f"doc_{fileID}"
+            collection_name = generate_unique_collection_name(base_name)
+            print(f"New collection name: {collection_name}")
+            # Noted on the job first, so a retry can drop it if this attempt dies
+            progress("creating", collection_name=collection_name)
+
+            try:
+                # Marked as ours, so the lifecycle sweeper may delete it if it ends up orphaned
+                collection = chroma_client.create_collection(
+                    name=collection_name,
+                    metadata=OWNER_METADATA,
+                )
+                logging.info(f"Created new collection: {collection_name}")
+                collection_lifecycle.record(collection_name)
+            except Exception as e:
+                logging.error(f"Error creating collection: {str(e)}")
+                return {'error': f'Failed to create new collection: {str(e)}'}, 500
+
+        # Create a BytesIO object to work with PyMuPDF
+        pdf_stream = BytesIO(file_bytes)
+        progress("extracting", pages_total=count_pages(pdf_stream))
+        
+        # Add chunks to the collection in batches as they come off the chunker,
+        # so the whole document never has to be split up front
+        page_texts = []
+        chunk_count = 0
+        pages_done = 0
+
+        def on_page(done):
+            nonlocal pages_done
+            pages_done = done
+            progress("extracting", pages_processed=pages_done, chunks_embedded=chunk_count)
+
+        lexical = LexicalIndexBuilder()
+        # Embeds the next batch while earlier ones are still being written
+        writer = IngestWriter(
+            collection,
+            embedding_engine.embed,
+            lambda chunk: chunk["id"],
+            lexical,
+            max_in_flight=INGEST_MAX_IN_FLIGHT,
+            max_batch=max_upsert_batch(),
+            existing=existing,
+        )
+        try:
+            chunks = create_chunks_from_bytes(pdf_stream, page_texts, on_page)
+            for chunk in with_chunk_ids(chunks, collection_name):
+                writer.add(chunk)
+                if writer.stats["chunks"] != chunk_count:
+                    chunk_count = writer.stats["chunks"]
+                    progress("embedding", pages_processed=pages_done, chunks_embedded=chunk_count)
+            chunk_count = writer.flush()
+            progress("finalizing", pages_processed=pages_done, chunks_embedded=chunk_count)
         except Exception as e:
             logging.error(f"Error adding documents to collection: {str(e)}")
+            # A half-updated collection stays registered without a content
+            # hash; the next upload of the document diffs against it again
+            if existing is None:
+                drop_collection(collection_name)
             return {'error': 'Failed to store documents'}, 500
 
+        if not chunk_count:
+            if existing is not None:
+                collection_registry.release(fileID)
+            drop_collection(collection_name)
+            return {'error': 'No valid text content could be extracted'}, 400
+
+        document = " ".join(page_texts)
+        document_cache.put(collection_name, document)
+        lexical_indexes.save(collection_name, lexical)
+        collection_lifecycle.record(collection_name, estimate_bytes(len(document.encode()), chunk_count), chunk_count)
+        if existing is not None:
+            answer_cache.invalidate(collection_name)
+        record_ingest(len(file_bytes), time.perf_counter() - started, writer)
+
+        # Another worker may have finished the same file while we were embedding
+        shared_name = collection_registry.claim_content(content_hash, collection_name)
+        if shared_name != collection_name:
+            # (an updated collection is dropped by register() below)
+            if existing is None:
+                drop_collection(collection_name)
+            collection = chroma_client.get_collection(name=shared_name)
+            collection_name = shared_name
+
+        unused = collection_registry.register(fileID, collection, content_hash)
+        if unused:
+            drop_collection(unused)
+
+        return {
+            'message': 'File processed and uploaded successfully',
+            'documents_processed': chunk_count,
+            'document_id': fileID,
+            'collection_id': collection_name,
+            'filename': filename,
+            'deduplicated': False,
+            'incremental': existing is not None,
+            'chunks_embedded': writer.stats["chunks"],
+            'chunks_reused': writer.stats["reused"],
+            'chunks_deleted': writer.stats["deleted"],
+            "document": document
+        }, 200
+
     except Exception as e:
         logging.error(f"Error in save_to_chromadb: {str(e)}")
         return {'error': str(e)}, 500
 
 
+@app.route('/documents/<document_id>', methods=['DELETE'])
+def delete_document(document_id):
+    """Forget a document; its collection is deleted once no other upload shares it."""
+    unused = collection_registry.release(document_id)
+    if unused:
+        drop_collection(unused)
+    return jsonify({'document_id': document_id, 'collection_deleted': bool(unused)}), 200
+
+
+@app.route('/collections', methods=['GET'])
+def list_collections():
+    """Stored collections with their size and last access, most recently used first."""
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    offset = request.args.get('offset', 0, type=int)
+    return jsonify({
+        'collections': collection_lifecycle.list(limit, offset),
+        'stats': collection_lifecycle.snapshot(),
+    }), 200
+
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload and return extracted text."""
+    """Queue an uploaded PDF for ingestion and return the job to poll."""
     if 'file' not in request.files:
         return jsonify({'error': 'No file part in the request'}), 400
 
@@ -208,29 +484,56 @@ def upload_file():
         return jsonify({'error': 'Only PDF files are supported'}), 400
 
     try:
-        # Read file into memory
-        file_stream = BytesIO(file.read())
-        
-        # Extract text
-        sentences = create_resources_from_bytes(file_stream)
-        print(sentences)
-        
-        if not sentences:
-            return jsonify({'error': 'Failed to extract text from PDF'}), 500
+        file_bytes = file.read()
+        if len(file_bytes) > MAX_FILE_SIZE:
+            return jsonify({'error': 'File is too large'}), 400
+
+        document_id = request.form.get('fileID') or str(uuid.uuid4())
+        job_id = ingest_jobs.submit(document_id, file.filename, file_bytes)
         
-        # Return extracted text
         return jsonify({
-            'message': 'File processed and uploaded successfully',
+            'message': 'File received, processing has started',
             'success': True,
-            'document': sentences,
-        })
+            'job_id': job_id,
+            'document_id': document_id,
+            'status_url': f'/jobs/{job_id}',
+        }), 202
     
     except Exception as e:
-        logging.error(f"Error processing PDF: {str(e)}")
+        logging.error(f"Error queueing PDF: {str(e)}")
         return jsonify({'error': f'Error processing PDF: {str(e)}'}), 500
 
-def ask_groq(query, context=None, document=None):
-    grok_prompt = f"""
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Stage, progress and (once done) the result of an ingestion job."""
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job), 200
+
+def run_ingest_job(job, progress):
+    # An earlier attempt died part way; the collection it created was never
+    # registered. Jobs are only retried once the earlier attempt's heartbeat
+    # has stopped, and if it does wake up its next progress() call fails.
+    leftover = job["collection_name"]
+    if job["attempts"] > 1 and leftover and not collection_registry.in_use(leftover):
+        logging.info(f"Dropping collection {leftover} left by an earlier attempt of job {job['id']}")
+        drop_collection(leftover)
+    with open(ingest_jobs.upload_path(job["id"]), "rb") as f:
+        file_bytes = f.read()
+    return ingest_pdf(file_bytes, job["filename"], job["document_id"], progress)
+
+ingest_jobs = JobQueue(
+    os.path.join(app.instance_path, 'jobs.db'),
+    os.path.join(app.instance_path, 'uploads'),
+    run_ingest_job,
+    max_workers=int(os.getenv('INGEST_WORKERS', 2)),
+    max_attempts=int(os.getenv('INGEST_MAX_ATTEMPTS', 3)),
+)
+
+def build_groq_prompt(query, context=None, document=None, history=None):
+    conversation = f"- **Conversation so far:**  \n{history}  \n" if history else ""
+    return f"""
             ### Prompt for RAG System
 
             **Instruction:**  
@@ -239,7 +542,7 @@ def ask_groq(query, context=None, document=None):
             1. **Context Retrieval (Step 1):**  
             - **Document:** {document}  
             - **Context:** {context}  
-            - **Query:** {query.lower()}  
+            {conversation}- **Query:** {query.lower()}  
 
             First, attempt to answer the query using the provided context. Look for relevant information within the context that directly relates to the query. If you can answer the query comprehensively using only this context, do so. If you cannot, proceed to use the entire document. Search for information in the document that can help answer the query. If you can answer using the document, do so. If you still cannot answer adequately, proceed to step 2.
 
@@ -261,18 +564,68 @@ def ask_groq(query, context=None, document=None):
             DO NOT include "Based on the provided context and knowledge-based approach, I can attempt to answer the query."
             """
 
-    chat_completion = client.chat.completions.create(
+# Tokens taken by the template itself, before any document/context is added
+GROQ_PROMPT_OVERHEAD = estimate_tokens(build_groq_prompt(""))
+
+def complete_groq(grok_prompt):
+    chat_completion = llm_clients.groq.chat.completions.create(
+        messages=[
+            {
+                "role": "user",
+                "content": grok_prompt,
+            }
+        ],
+        model=GROQ_MODEL,
+    )
+
+    return chat_completion.choices[0].message.content
+
+def stream_groq(grok_prompt):
+    """Yield the answer to grok_prompt token by token as Groq generates it."""
+    stream = llm_clients.groq.chat.completions.create(
         messages=[
             {
                 "role": "user",
                 "content": grok_prompt,
             }
         ],
-        model="llama-3.3-70b-versatile",
+        model=GROQ_MODEL,
+        stream=True,
     )
 
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        # Frees the connection when the router cancels a losing stream
+        stream.close()
+
+async def acomplete_groq(grok_prompt):
+    chat_completion = await llm_clients.groq_async.chat.completions.create(
+        messages=[{"role": "user", "content": grok_prompt}],
+        model=GROQ_MODEL,
+    )
     return chat_completion.choices[0].message.content
 
+async def astream_groq(grok_prompt):
+    stream = await llm_clients.groq_async.chat.completions.create(
+        messages=[{"role": "user", "content": grok_prompt}],
+        model=GROQ_MODEL,
+        stream=True,
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+def ask_groq(query, context=None, document=None, history=None):
+    grok_prompt = build_groq_prompt(query, context, document, history)
+    record_prompt(grok_prompt, GROQ_MODEL)
+    return complete_groq(grok_prompt)
+
 # def ask_ollama(query, context=None, document=None):
 #     """Query OLLAMA model with extracted context."""
 #     grok_prompt = f"""
@@ -318,9 +671,7 @@ def ask_groq(query, context=None, document=None):
 #         logging.error(f"Error querying OLLAMA: {e}")
 #         return "Error retrieving response"
     
-def llm_online(query, context=None):
-    """Query OLLAMA model with extracted context."""
-
+def build_online_prompt(query, context=None):
     if context:
         prompt = f"""You are an expert information retriever.  Answer the user's question using *only* the information provided in the context below.  If the context does not contain the answer, try to use your general knowledge.  Do not mention the context in your response.
         **Context:**
@@ -336,46 +687,298 @@ def llm_online(query, context=None):
         Please answer the following question:
         {query}
         """
+    return prompt
 
-    client = openai.OpenAI(
-        api_key=SAMBANOVA_API_KEY,
-        base_url="https://api.sambanova.ai/v1",
-    )
-
-    response = client.chat.completions.create(
-        model="Meta-Llama-3.3-70B-Instruct",
+def _online_completion(prompt, stream=False):
+    return llm_clients.sambanova.chat.completions.create(
+        model=SAMBANOVA_MODEL,
         messages=[{"role":"system","content":prompt}],
         temperature=0.7,
-        top_p=0.1
+        top_p=0.1,
+        stream=stream
     )
 
+def complete_online(prompt):
+    response = _online_completion(prompt)
+    return response.choices[0].message.content
 
+def stream_online(prompt):
+    stream = _online_completion(prompt, stream=True)
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        stream.close()
+
+async def acomplete_online(prompt):
+    response = await llm_clients.sambanova_async.chat.completions.create(
+        model=SAMBANOVA_MODEL,
+        messages=[{"role": "system", "content": prompt}],
+        temperature=0.7,
+        top_p=0.1,
+    )
     return response.choices[0].message.content
 
+async def astream_online(prompt):
+    stream = await llm_clients.sambanova_async.chat.completions.create(
+        model=SAMBANOVA_MODEL,
+        messages=[{"role": "system", "content": prompt}],
+        temperature=0.7,
+        top_p=0.1,
+        stream=True,
+    )
+    try:
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    finally:
+        await stream.close()
+
+def llm_online(query, context=None):
+    """Query SambaNova model with extracted context."""
+    return complete_online(build_online_prompt(query, context))
+
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama3.2')
+# Ollama's default 2048-token window would cut off a prompt sized for llama3.2
+OLLAMA_OPTIONS = {"num_ctx": int(os.getenv('OLLAMA_NUM_CTX', 4096))}
+
+def complete_ollama(prompt):
+    response = llm_clients.ollama.post(
+        {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "options": OLLAMA_OPTIONS}
+    )
+    response.raise_for_status()
+    return response.json()["response"]
+
+def stream_ollama(prompt):
+    return llm_clients.ollama.stream({"model": OLLAMA_MODEL, "prompt": prompt, "options": OLLAMA_OPTIONS})
+
+async def acomplete_ollama(prompt):
+    response = await llm_clients.ollama_async.post(
+        {"model": OLLAMA_MODEL, "prompt": prompt, "stream": False, "options": OLLAMA_OPTIONS}
+    )
+    response.raise_for_status()
+    return response.json()["response"]
+
+def astream_ollama(prompt):
+    return llm_clients.ollama_async.stream({"model": OLLAMA_MODEL, "prompt": prompt, "options": OLLAMA_OPTIONS})
+
+# Providers /search may answer with, chosen per request by the router;
+# "mock" answers locally, for running the server offline
+LLM_PROVIDERS = {
+    "groq": lambda: Provider("groq", complete_groq, stream_groq, acomplete_groq, astream_groq, model=GROQ_MODEL),
+    "sambanova": lambda: Provider("sambanova", complete_online, stream_online, acomplete_online, astream_online,
+                                  model=SAMBANOVA_MODEL),
+    "ollama": lambda: Provider("ollama", complete_ollama, stream_ollama, acomplete_ollama, astream_ollama,
+                               model=OLLAMA_MODEL),
+    "mock": lambda: MockProvider("mock"),
+}
+llm_router = LLMRouter(
+    [LLM_PROVIDERS[name.strip()]() for name in os.getenv('LLM_PROVIDERS', 'groq').split(',')],
+    # Off by default: a hedge can pay for a second answer
+    hedge=os.getenv('LLM_HEDGE', '0') == '1',
+)
+
+
+# Per-session windows of recent turns for conversation-aware retrieval
+conversations = Conversations(
+    window=int(os.getenv('CONVERSATION_WINDOW', 4)),
+    reuse_threshold=float(os.getenv('CONVERSATION_REUSE_THRESHOLD', 0.95)),
+    complete=llm_router.complete if CONDENSE_MODE == 'llm' else None,
+)
+
+def sse_response(tokens, **done):
+    """
+    Relay a token generator as server-sent events: one "data: {"token": ...}"
+    event per token, then a "done" event carrying done as its payload.
+    """
+    def events():
+        try:
+            for token in tokens:
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        except Exception as e:
+            logging.error(f"Streaming failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        # Stop proxies (nginx, Railway) from buffering the whole answer
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def get_document_text(collection):
+    """Full document text for a collection, from the cache when possible."""
+    document = document_cache.get(collection.name)
+    if document is None:
+        # Uploaded before the cache existed (or the cache was cleared)
+        document = " ".join(collection.get()['documents'])
+        document_cache.put(collection.name, document)
+    return document
+
+
+def retrieve(collection, collection_name, query, query_embedding):
+    """The CONTEXT_HITS best chunks for query, as a collection.query result."""
+    # Dense and BM25 retrieval run side by side, then get fused by rank
+    rerank = reranker is not None and reranker.available
+    candidates = max(RETRIEVAL_CANDIDATES, RERANK_CANDIDATES) if rerank else RETRIEVAL_CANDIDATES
+    keep = candidates if rerank else CONTEXT_HITS
+    lexical_index = lexical_indexes.get(collection_name)
+    if lexical_index is not None:
+        lexical_hits = retrieval_pool.submit(lexical_index.search, query, candidates)
+        results = collection.query(query_embeddings=[query_embedding], n_results=candidates)
+        results = reciprocal_rank_fusion(results, lexical_index, lexical_hits.result(), keep)
+    else:
+        results = collection.query(query_embeddings=[query_embedding], n_results=keep)
+    if rerank:
+        # Falls back to the fused order if scoring doesn't finish within budget
+        results = reranker.rerank(query, results, CONTEXT_HITS)
+    return results
+
+
+def prepare_search(data):
+    """
+    Validate a /search body and either find a cached answer or build the prompt.
+
+    Returns (plan, error) where error is a (body, status) pair. plan has
+    "answer" set on a cache hit, otherwise "prompt" and "prompt_tokens".
+    """
+    user_input = (data or {}).get("text", "").strip()
+    
+    if not user_input:
+        return None, ({"error": "Missing user input"}, 400)
+
+    # The document_id the upload returned; there is no "current" document,
+    # since other users upload into the same server
+    document_id = data.get("document_id")
+    if not document_id:
+        return None, ({"error": "Missing document_id"}, 400)
+
+    collection, collection_name = get_or_create_collection(document_id)
+    
+    if not collection:
+        return None, ({"error": "No documents available. Please upload a file first."}, 400)
+
+    # Follow-up questions are answered in light of the session's last turns
+    session_id = data.get("session_id")
+    messages = chat_history.recent(session_id, collection_name) if session_id else []
+    history = format_history(messages, HISTORY_TOKENS)
+    # ...and retrieved as the standalone question they stand for, so
+    # "explain that again" doesn't go to the vector store verbatim
+    retrieval_query = conversations.condense(
+        session_id, collection_name, user_input, messages
+    ) if session_id else user_input
+
+    # One embedding call: the question (for the answer cache) and, for a
+    # condensed follow-up, the query that is actually retrieved
+    texts = [normalize_query(user_input)]
+    if retrieval_query != user_input:
+        texts.append(normalize_query(retrieval_query))
+    # Ahead of any ingest texts queued on the same model
+    embeddings = embedding_engine.embed(texts, urgent=True)
+    query_embedding, retrieval_embedding = embeddings[0], embeddings[-1]
+    plan = {
+        "collection_name": collection_name,
+        "session_id": session_id,
+        "history": history,
+        "query": user_input,
+        "query_embedding": query_embedding,
+        # An answer that depends on the conversation can't be shared
+        "answer": None if history else answer_cache.lookup(collection_name, query_embedding),
+        "prompt": None,
+        "prompt_tokens": 0,
+    }
+    if plan["answer"] is not None:
+        remember_turn(plan, plan["answer"])
+        return plan, None
+
+    # A follow-up that condenses to (nearly) the last query gets the same chunks
+    results = conversations.reuse(session_id, collection_name, retrieval_embedding) if session_id else None
+    reused = results is not None
+    if not reused:
+        results = retrieve(collection, collection_name, retrieval_query, retrieval_embedding)
+    if session_id:
+        conversations.remember(
+            session_id, collection_name, user_input, retrieval_query, retrieval_embedding, results, reused
+        )
+    document = get_document_text(collection)
+
+    # Spend the model's token budget on the hits, their neighbours and then
+    # the head of the document, instead of sending everything. The router
+    # may fail over or hedge to any provider, so the prompt has to fit the
+    # smallest of them.
+    overhead = GROQ_PROMPT_OVERHEAD + 2 * estimate_tokens(user_input) + estimate_tokens(history)
+    model = min(llm_router.models, key=lambda model: budget_for(model, overhead))
+    context, document_head, _ = build_context(results, budget_for(model, overhead), collection, document)
+    plan["prompt"] = build_groq_prompt(user_input, context, document_head, history)
+    plan["prompt_tokens"] = record_prompt(plan["prompt"], model)
+    return plan, None
+
+def remember_turn(plan, answer):
+    """Queue the question and answer onto the session's history (written in the background)."""
+    if plan["session_id"]:
+        chat_history.append(plan["session_id"], plan["collection_name"], "user", plan["query"])
+        chat_history.append(plan["session_id"], plan["collection_name"], "assistant", answer)
+
+def cache_answer(plan, answer, started):
+    remember_turn(plan, answer)
+    if plan["history"]:
+        return
+    answer_cache.store(
+        plan["collection_name"], plan["query"], plan["query_embedding"], answer, time.time() - started
+    )
+
+def _stream_and_cache(plan):
+    started = time.time()
+    parts = []
+    for token in llm_router.stream(plan["prompt"]):
+        parts.append(token)
+        yield token
+    cache_answer(plan, "".join(parts), started)
+
 
 @app.route("/search", methods=["POST"])
 def search():
-    """Retrieve relevant data from ChromaDB and query OLLAMA."""
+    """Retrieve relevant data from ChromaDB and query the LLM router."""
     try:
         data = request.get_json()
-        user_input = data.get("text", "").strip()
-        
-        if not user_input:
-            return jsonify({"error": "Missing user input"}), 400
+        if data and data.get("stream"):
+            return search_stream()
 
-        # Get the current collection
-        collection, _ = get_or_create_collection()
-        
-        if not collection:
-            return jsonify({"error": "No documents available. Please upload a file first."}), 400
-            
-        results = collection.query(query_texts=[user_input], n_results=4)
-        documents = collection.get()['documents']
+        plan, error = prepare_search(data)
+        if error:
+            return error
 
-        context = "\n".join(results['documents'][0]) if results['documents'][0] else ""
-        answer = ask_groq(user_input, context, documents)
+        if plan["answer"] is not None:
+            return jsonify({"results": plan["answer"], "prompt_tokens": 0, "cached": True}), 200
+
+        started = time.time()
+        answer = llm_router.complete(plan["prompt"])
+        cache_answer(plan, answer, started)
         
-        return jsonify({"results": answer}), 200
+        return jsonify({"results": answer, "prompt_tokens": plan["prompt_tokens"], "cached": False}), 200
+
+    except LLMUnavailable as e:
+        logging.error(f"Search failed: {e}")
+        return jsonify({"error": f"Search failed: {str(e)}"}), 503
+    except Exception as e:
+        logging.error(f"Search failed: {e}")
+        return jsonify({"error": f"Search failed: {str(e)}"}), 500
+
+@app.route("/search/stream", methods=["POST"])
+def search_stream():
+    """Same as /search, but streams the answer back as server-sent events."""
+    try:
+        plan, error = prepare_search(request.get_json())
+        if error:
+            return error
+
+        if plan["answer"] is not None:
+            return sse_response(iter([plan["answer"]]), prompt_tokens=0, cached=True)
+
+        return sse_response(_stream_and_cache(plan), prompt_tokens=plan["prompt_tokens"], cached=False)
 
     except Exception as e:
         logging.error(f"Search failed: {e}")
@@ -420,5 +1023,23 @@ def extract_text():
         logging.error(f"Error processing PDF: {str(e)}")
         return jsonify({'error': f'Error processing PDF: {str(e)}'}), 500
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """In-process counters for this worker."""
+    return jsonify({
+        'document_cache': document_cache.snapshot(),
+        'prompts': dict(prompt_stats),
+        'answer_cache': answer_cache.snapshot(),
+        'embeddings': embedding_engine.snapshot(),
+        'embedding_cache': embedding_engine.cache.snapshot(),
+        'reranker': reranker.snapshot() if reranker else None,
+        'llm': llm_clients.snapshot(),
+        'llm_router': llm_router.snapshot(),
+        'ingest': ingest_snapshot(),
+        'collections': collection_lifecycle.snapshot(),
+        'chat_history': chat_history.snapshot(),
+        'conversations': conversations.snapshot(),
+    })
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
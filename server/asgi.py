@@ -0,0 +1,167 @@
+"""
+ASGI entry point: the same routes and JSON as app.py, with the request paths
+that mostly wait on I/O served from an asyncio event loop.
+
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --chdir /app
+
+/search, /search/stream, /upload and /jobs/<id> run here. Retrieval
+(embedding, vector and BM25 search, reranking) and SQLite work go to worker
+threads, and the LLM call is awaited through the router's async path, so a
+request waiting on the LLM holds a coroutine rather than a whole worker.
+Every other route is served by the Flask app underneath.
+"""
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as wsgi
+
+
+async def _single(token):
+    yield token
+
+
+async def _stream_and_cache(plan):
+    started = time.time()
+    parts = []
+    async for token in wsgi.llm_router.astream(plan["prompt"]):
+        parts.append(token)
+        yield token
+    await asyncio.to_thread(wsgi.cache_answer, plan, "".join(parts), started)
+
+
+def sse_response(tokens, **done):
+    """Async counterpart of app.sse_response, relaying an async token generator."""
+    async def events():
+        try:
+            async for token in tokens:
+                yield f"data: {json.dumps({'token': token})}\n\n"
+            yield f"event: done\ndata: {json.dumps(done)}\n\n"
+        except Exception as e:
+            logging.error(f"Streaming failed: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def search(request):
+    """Retrieve relevant data and query the LLM router without blocking the event loop."""
+    try:
+        data = await _json_body(request)
+        if data and data.get("stream"):
+            return await _search_stream(data)
+
+        plan, error = await asyncio.to_thread(wsgi.prepare_search, data)
+        if error:
+            return JSONResponse(*error)
+
+        if plan["answer"] is not None:
+            return JSONResponse({"results": plan["answer"], "prompt_tokens": 0, "cached": True})
+
+        started = time.time()
+        answer = await wsgi.llm_router.acomplete(plan["prompt"])
+        await asyncio.to_thread(wsgi.cache_answer, plan, answer, started)
+
+        return JSONResponse({"results": answer, "prompt_tokens": plan["prompt_tokens"], "cached": False})
+
+    except wsgi.LLMUnavailable as e:
+        logging.error(f"Search failed: {e}")
+        return JSONResponse({"error": f"Search failed: {str(e)}"}, 503)
+    except Exception as e:
+        logging.error(f"Search failed: {e}")
+        return JSONResponse({"error": f"Search failed: {str(e)}"}, 500)
+
+
+async def _search_stream(data):
+    try:
+        plan, error = await asyncio.to_thread(wsgi.prepare_search, data)
+        if error:
+            return JSONResponse(*error)
+
+        if plan["answer"] is not None:
+            return sse_response(_single(plan["answer"]), prompt_tokens=0, cached=True)
+
+        return sse_response(_stream_and_cache(plan), prompt_tokens=plan["prompt_tokens"], cached=False)
+
+    except Exception as e:
+        logging.error(f"Search failed: {e}")
+        return JSONResponse({"error": f"Search failed: {str(e)}"}, 500)
+
+
+async def search_stream(request):
+    """Same as /search, but streams the answer back as server-sent events."""
+    return await _search_stream(await _json_body(request))
+
+
+async def upload_file(request):
+    """Queue an uploaded PDF for ingestion and return the job to poll."""
+    form = await request.form()
+    file = form.get('file')
+    if file is None or isinstance(file, str):
+        return JSONResponse({'error': 'No file part in the request'}, 400)
+
+    if not file.filename:
+        return JSONResponse({'error': 'No file selected'}, 400)
+
+    if not file.filename.lower().endswith('.pdf'):
+        return JSONResponse({'error': 'Only PDF files are supported'}, 400)
+
+    try:
+        file_bytes = await file.read()
+        if len(file_bytes) > wsgi.MAX_FILE_SIZE:
+            return JSONResponse({'error': 'File is too large'}, 400)
+
+        document_id = form.get('fileID') or str(uuid.uuid4())
+        job_id = await asyncio.to_thread(wsgi.ingest_jobs.submit, document_id, file.filename, file_bytes)
+
+        return JSONResponse({
+            'message': 'File received, processing has started',
+            'success': True,
+            'job_id': job_id,
+            'document_id': document_id,
+            'status_url': f'/jobs/{job_id}',
+        }, 202)
+
+    except Exception as e:
+        logging.error(f"Error queueing PDF: {str(e)}")
+        return JSONResponse({'error': f'Error processing PDF: {str(e)}'}, 500)
+
+
+async def job_status(request):
+    """Stage, progress and (once done) the result of an ingestion job."""
+    job = await asyncio.to_thread(wsgi.ingest_jobs.get, request.path_params['job_id'])
+    if job is None:
+        return JSONResponse({'error': 'Unknown job'}, 404)
+    return JSONResponse(job)
+
+
+app = Starlette(
+    routes=[
+        Route('/search', search, methods=['POST']),
+        Route('/search/stream', search_stream, methods=['POST']),
+        Route('/upload', upload_file, methods=['POST']),
+        Route('/jobs/{job_id}', job_status, methods=['GET']),
+        Mount('/', app=WSGIMiddleware(wsgi.app)),
+    ],
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])],
+)
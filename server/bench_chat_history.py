@@ -0,0 +1,73 @@
+"""
+Latency of reading recent chat history while messages are being written.
+
+    python bench_chat_history.py [--messages 200000] [--sessions 10000] [--reads 5000]
+
+Fills a fresh chat.db with --messages messages spread over --sessions
+sessions, then times recent() (p50/p99) while a background thread keeps
+appending, and append() itself, which only queues the message.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from chat_history import ChatHistory
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--sessions", type=int, default=10000)
+    parser.add_argument("--reads", type=int, default=5000)
+    args = parser.parse_args()
+    rng = random.Random(0)
+    workdir = tempfile.mkdtemp()
+    try:
+        history = ChatHistory(os.path.join(workdir, "chat.db"))
+        for i in range(args.messages):
+            session = f"session-{rng.randrange(args.sessions)}"
+            history.append(session, "doc_bench", "user" if i % 2 == 0 else "assistant", "word " * 60)
+        history.flush()
+
+        stop = threading.Event()
+        appends = []
+
+        def writer():
+            while not stop.is_set():
+                started = time.perf_counter()
+                history.append(f"session-{rng.randrange(args.sessions)}", "doc_bench", "user", "word " * 60)
+                appends.append(time.perf_counter() - started)
+                time.sleep(0.001)
+
+        thread = threading.Thread(target=writer, daemon=True)
+        thread.start()
+        reads = []
+        for _ in range(args.reads):
+            session = f"session-{rng.randrange(args.sessions)}"
+            started = time.perf_counter()
+            history.recent(session, "doc_bench")
+            reads.append(time.perf_counter() - started)
+        stop.set()
+        thread.join()
+        history.flush()
+
+        stats = history.snapshot()
+        print(f"{args.messages} messages, {args.sessions} sessions, {stats['batches']} write batches")
+        print(f"recent(): p50 {statistics.median(reads) * 1000:.3f}ms  p99 {percentile(reads, 0.99) * 1000:.3f}ms")
+        print(f"append(): p50 {statistics.median(appends) * 1000:.3f}ms  p99 {percentile(appends, 0.99) * 1000:.3f}ms")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
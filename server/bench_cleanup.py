@@ -0,0 +1,50 @@
+"""
+Compare full_text_cleanup against fast_text_cleanup / iter_cleaned_pages on the
+PDFs in progress/doc.
+
+    python bench_cleanup.py [pdf ...]
+"""
+import glob
+import os
+import sys
+import time
+
+from extraction import extract_pages
+from utils import full_text_cleanup, fast_text_cleanup, iter_cleaned_pages
+
+DOC_DIR = os.path.join(os.path.dirname(__file__), "..", "progress", "doc")
+ROUNDS = 5
+
+
+def best_of(func, *args):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def clean_streaming(pages):
+    return " ".join(page["text"] for page in iter_cleaned_pages(pages) if page["text"])
+
+
+def main(paths):
+    print(f"{'file':<28}{'pages':>7}{'MB':>7}{'old ms':>10}{'fast ms':>10}{'stream ms':>11}  same")
+    for path in paths:
+        with open(path, "rb") as pdf_file:
+            pages = list(extract_pages(pdf_file.read()))
+        text = "".join(page["text"] for page in pages)
+
+        old_time, old = best_of(full_text_cleanup, text)
+        fast_time, fast = best_of(fast_text_cleanup, text)
+        stream_time, streamed = best_of(clean_streaming, pages)
+
+        print(f"{os.path.basename(path)[:27]:<28}{len(pages):>7}{len(text.encode()) / 1e6:>7.2f}"
+              f"{old_time * 1000:>10.1f}{fast_time * 1000:>10.1f}{stream_time * 1000:>11.1f}"
+              f"  {old == fast and fast == streamed}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or sorted(glob.glob(os.path.join(DOC_DIR, "*.pdf"))))
@@ -0,0 +1,131 @@
+"""
+Retrieval calls and condensing tokens per session with conversation-aware
+retrieval, against sending every question to the vector store verbatim.
+
+    python bench_conversation.py [--sessions 200] [--real-embeddings]
+
+Sessions are scripted: an opening question about a topic, then a mix of
+follow-ups ("explain that again with an example", "what about its role
+in X") and new questions. "on topic" is the share of follow-ups whose
+retrieval query still names the topic they refer to. Embeddings are a
+hashed bag of words unless --real-embeddings loads the model. Tokens are
+saved against an LLM rewrite of every question that has history, which
+the default rules-based condensing replaces.
+
+Standalone questions asked after an unrelated turn must reach retrieval
+unchanged; the run exits 1 if any in STANDALONE gets condensed.
+"""
+import argparse
+import random
+import sys
+import zlib
+
+import numpy as np
+
+from answer_cache import normalize_query
+from conversation import Conversations, is_follow_up
+
+DIM = 384
+TOPICS = ["osmosis", "active transport", "the sodium potassium pump", "enzyme kinetics",
+          "cellular respiration", "photosynthesis", "the cell membrane", "protein folding"]
+FOLLOW_UPS = ["explain that again with an example", "can you simplify it", "why?",
+              "give me more details", "what about its role in {other}", "how does it differ from {other}"]
+
+# New questions that mention words a looser follow-up test would take as
+# pointing back ("example", "there", "this")
+STANDALONE = ["Give an example of osmosis", "Are there risks in surgery?",
+              "What does this paper conclude about enzymes?", "Is it true that enzymes speed up reactions?",
+              "What is one cause of diabetes?", "How do these drugs affect blood pressure?"]
+
+
+def hashed_embed(texts):
+    vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for word in text.split():
+            vectors[row, zlib.crc32(word.encode()) % DIM] += 1
+    return vectors
+
+
+def script(rng, turns):
+    topic = rng.choice(TOPICS)
+    session = [(f"what is {topic}", topic)]
+    for _ in range(turns - 1):
+        if rng.random() < 0.7:
+            other = rng.choice([t for t in TOPICS if t != topic])
+            session.append((rng.choice(FOLLOW_UPS).format(other=other), topic))
+        else:
+            topic = rng.choice(TOPICS)
+            session.append((f"how does {topic} work", topic))
+    return session
+
+
+def run(sessions, embed):
+    conversations = Conversations()
+    retrievals = on_topic = follow_ups = 0
+    for number, session in enumerate(sessions):
+        session_id = f"session-{number}"
+        messages = []
+        for question, topic in session:
+            query = conversations.condense(session_id, "doc_bench", question, messages)
+            embedding = embed([normalize_query(query)])[0]
+            results = conversations.reuse(session_id, "doc_bench", embedding)
+            reused = results is not None
+            if not reused:
+                retrievals += 1
+                results = {"ids": [[query]]}
+            conversations.remember(session_id, "doc_bench", question, query, embedding, results, reused)
+            if messages and is_follow_up(question):
+                follow_ups += 1
+                on_topic += topic in query
+            messages += [{"role": "user", "content": question}, {"role": "assistant", "content": "An answer. " * 40}]
+    return retrievals, on_topic / max(follow_ups, 1), conversations.snapshot()
+
+
+def check_standalone():
+    """Questions in STANDALONE that condense() rewrote after "what is photosynthesis"."""
+    conversations = Conversations()
+    history = [{"role": "user", "content": "what is photosynthesis"},
+               {"role": "assistant", "content": "An answer."}]
+    rewritten = []
+    for question in STANDALONE:
+        query = conversations.condense("standalone", "doc_bench", question, history)
+        if query != question:
+            rewritten.append((question, query))
+    return rewritten
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--real-embeddings", action="store_true")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    sessions = [script(rng, args.turns) for _ in range(args.sessions)]
+    if args.real_embeddings:
+        from embeddings import EmbeddingEngine
+        embed = EmbeddingEngine().embed
+    else:
+        embed = hashed_embed
+
+    turns = sum(len(session) for session in sessions)
+    verbatim_on_topic = sum(
+        topic in question for session in sessions for question, topic in session[1:] if is_follow_up(question)
+    ) / max(sum(is_follow_up(q) for session in sessions for q, _ in session[1:]), 1)
+    retrievals, on_topic, stats = run(sessions, embed)
+
+    print(f"{args.sessions} sessions x {args.turns} turns\n")
+    print(f"{'mode':<16}{'retrievals/session':>20}{'on topic':>10}{'LLM tokens saved/session':>26}")
+    print(f"{'verbatim':<16}{turns / args.sessions:>20.2f}{verbatim_on_topic:>10.0%}{'-':>26}")
+    print(f"{'conversational':<16}{retrievals / args.sessions:>20.2f}{on_topic:>10.0%}"
+          f"{stats['tokens_saved_per_session']:>26.0f}")
+
+    rewritten = check_standalone()
+    print(f"\nstandalone questions kept verbatim: {len(STANDALONE) - len(rewritten)}/{len(STANDALONE)}")
+    for question, query in rewritten:
+        print(f"  {question!r} -> {query!r}")
+    sys.exit(1 if rewritten else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Ingest time per MB of PDF, with vector store writes done one batch at a time
+(the old loop) versus pipelined through IngestWriter, and the cost of
+re-ingesting a revised version of the document incrementally.
+
+    python bench_ingest.py [--pdf book.pdf] [--rtt 0.15] [--embed-ms 2] [--real-embeddings]
+                           [--revise-pages 10]
+
+Writes go to a local collection behind a simulated network round-trip of
+--rtt seconds per request (plus payload transfer at --mbps). Embedding is
+simulated at --embed-ms per chunk unless --real-embeddings loads the model.
+Without --pdf a 200-page synthetic PDF is generated. For the incremental
+run, --revise-pages consecutive pages in the middle are rewritten (a
+revised chapter) and the new version is diffed against the stored one.
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import fitz
+import numpy as np
+
+from chunker import iter_chunks
+from extraction import extract_pages
+from ingest_writer import IngestWriter, with_chunk_ids
+from utils import iter_cleaned_pages
+from vector_store import LocalVectorStore
+
+DIM = 384
+WORDS = ("cell", "membrane", "protein", "energy", "the", "of", "transport", "is",
+         "gradient", "and", "enzyme", "reaction", "rate", "which", "binds")
+
+
+def page_text(rng):
+    return ". ".join(" ".join(rng.choices(WORDS, k=rng.randint(6, 20))) for _ in range(30)) + "."
+
+
+def synthetic_pdf(pages):
+    rng = random.Random(0)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), page_text(rng), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def revise(pdf_bytes, pages):
+    """Rewrite `pages` consecutive pages in the middle of the document."""
+    rng = random.Random(1)
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    start = max(0, (len(doc) - pages) // 2)
+    for number in range(start, min(start + pages, len(doc))):
+        page = doc[number]
+        page.add_redact_annot(page.rect)
+        page.apply_redactions()
+        page.insert_textbox(page.rect + (36, 36, -36, -36), page_text(rng), fontsize=9)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+class RemoteCollection:
+    """A local collection that pays a network round-trip per write."""
+
+    def __init__(self, collection, rtt, mbps):
+        self.collection = collection
+        self.rtt = rtt
+        self.bytes_per_second = mbps * 1024 * 1024 / 8
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        payload = sum(len(text) for text in documents) + np.asarray(embeddings).size * 20
+        time.sleep(self.rtt + payload / self.bytes_per_second)
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(self, ids, metadatas):
+        time.sleep(self.rtt)
+        self.collection.update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        time.sleep(self.rtt)
+        self.collection.delete(ids=ids)
+
+    def get(self, **kwargs):
+        time.sleep(self.rtt)
+        return self.collection.get(**kwargs)
+
+
+def make_embed(args):
+    if args.real_embeddings:
+        from embeddings import EmbeddingEngine
+        return EmbeddingEngine().embed
+    rng = np.random.default_rng(0)
+
+    def embed(texts):
+        time.sleep(len(texts) * args.embed_ms / 1000)
+        return rng.standard_normal((len(texts), DIM), dtype=np.float32)
+    return embed
+
+
+def ingest(pdf_bytes, collection, embed, existing=None, **writer_options):
+    started = time.perf_counter()
+    if existing is not None:
+        stored = collection.get(include=["metadatas"])
+        existing = dict(zip(stored["ids"], stored["metadatas"]))
+    writer = IngestWriter(collection, embed, lambda chunk: chunk["id"], existing=existing, **writer_options)
+    chunks = iter_chunks(iter_cleaned_pages(extract_pages(pdf_bytes)), content_defined=True)
+    for chunk in with_chunk_ids(chunks, collection.collection.name):
+        writer.add(chunk)
+    writer.flush()
+    return time.perf_counter() - started, writer.stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf")
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--rtt", type=float, default=0.15)
+    parser.add_argument("--mbps", type=float, default=50.0)
+    parser.add_argument("--embed-ms", type=float, default=2.0)
+    parser.add_argument("--real-embeddings", action="store_true")
+    parser.add_argument("--revise-pages", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.pdf:
+        with open(args.pdf, "rb") as f:
+            pdf_bytes = f.read()
+    else:
+        pdf_bytes = synthetic_pdf(args.pages)
+    megabytes = len(pdf_bytes) / (1024 * 1024)
+    embed = make_embed(args)
+    workdir = tempfile.mkdtemp()
+    store = LocalVectorStore(os.path.join(workdir, "vectors"))
+
+    modes = {
+        "sequential (batches of 100)": dict(max_in_flight=0, target_bytes=10 ** 12, max_batch=100),
+        "pipelined": dict(),
+    }
+    print(f"{megabytes:.2f}MB PDF, rtt {args.rtt * 1000:.0f}ms\n")
+    print(f"{'mode':<30}{'seconds':>9}{'s/MB':>9}{'embedded':>10}{'reused':>8}{'deleted':>9}{'upserts':>9}")
+
+    def report(label, elapsed, stats):
+        print(f"{label:<30}{elapsed:>9.2f}{elapsed / megabytes:>9.2f}{stats['chunks']:>10}"
+              f"{stats['reused']:>8}{stats['deleted']:>9}{stats['batches']:>9}")
+
+    try:
+        for label, options in modes.items():
+            name = f"bench_{time.time_ns()}"
+            collection = RemoteCollection(store.create_collection(name=name), args.rtt, args.mbps)
+            elapsed, stats = ingest(pdf_bytes, collection, embed, **options)
+            report(label, elapsed, stats)
+            if options:
+                store.delete_collection(name)
+        full = elapsed
+
+        # The pipelined collection now holds the original; update it to the revision
+        elapsed, stats = ingest(revise(pdf_bytes, args.revise_pages), collection, embed, existing={})
+        report(f"incremental ({args.revise_pages} pages revised)", elapsed, stats)
+        embedded = stats["chunks"] / max(stats["chunks"] + stats["reused"], 1)
+        print(f"\nincremental re-ingest: {elapsed / full:.1%} of a full ingest's time, "
+              f"{embedded:.1%} of its chunks embedded, {stats['moved']} metadata updates")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
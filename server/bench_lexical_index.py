@@ -0,0 +1,78 @@
+"""
+Cost of a worker's first lexical search on a collection: loading the
+index from disk, then one BM25 query, then fusing its hits (text and
+metadata read from the index) into a search result.
+
+    python bench_lexical_index.py [--sizes 10000 100000]
+
+Chunks are ~150 words drawn from a Zipf-distributed vocabulary, roughly
+the CHUNK_SIZE=1000 character chunks ingest produces. Load time is
+opening the index cold, what every gunicorn worker pays once per
+collection (and again after a re-ingest).
+"""
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from lexical_index import LexicalIndex, LexicalIndexBuilder, reciprocal_rank_fusion
+
+WORDS_PER_CHUNK = 150
+VOCABULARY = 30000
+
+
+def directory_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10000, 100000])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(VOCABULARY)]
+
+    print(f"{'chunks':>8}{'build s':>10}{'index MB':>10}{'load ms':>10}{'query p50 ms':>14}{'fuse p50 ms':>13}")
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp()
+        try:
+            builder = LexicalIndexBuilder()
+            ranks = np.minimum(rng.zipf(1.3, size=(size, WORDS_PER_CHUNK)), VOCABULARY) - 1
+            started = time.perf_counter()
+            for i, row in enumerate(ranks):
+                builder.add(f"chunk-{i:016x}", " ".join(words[r] for r in row),
+                            {"page_number": i // 10, "page_end": i // 10, "chunk_index": i})
+            path = os.path.join(workdir, "index")
+            builder.save(path)
+            build = time.perf_counter() - started
+
+            loads = []
+            for _ in range(5):
+                started = time.perf_counter()
+                index = LexicalIndex(path)
+                loads.append(time.perf_counter() - started)
+            queries = [" ".join(words[r] for r in rng.integers(0, 2000, 6)) for _ in range(200)]
+            searches = []
+            fusions = []
+            # No vector hits, so every fused chunk is read from the index
+            empty = {"ids": [[]], "documents": [[]], "metadatas": [[]]}
+            for query in queries:
+                started = time.perf_counter()
+                hits = index.search(query, 40)
+                searches.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                reciprocal_rank_fusion(empty, index, hits, 10)
+                fusions.append(time.perf_counter() - started)
+            print(f"{size:>8}{build:>10.1f}{directory_bytes(path) / 1e6:>10.1f}"
+                  f"{statistics.median(loads) * 1000:>10.2f}{statistics.median(searches) * 1000:>14.2f}"
+                  f"{statistics.median(fusions) * 1000:>13.3f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
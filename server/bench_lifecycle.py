@@ -0,0 +1,71 @@
+"""
+How collection bookkeeping scales with the number of collections.
+
+    python bench_lifecycle.py [--sizes 1000 10000 50000]
+
+For each size, a lifecycle database is filled with that many collections and
+the per-call cost of touch() (every search), list() (one page) and
+snapshot() (/metrics) is timed, along with one sweep that finds nothing to
+evict. The vector store is a stub that only lists names.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from lifecycle import CollectionLifecycle
+
+
+class StubStore:
+    def __init__(self, names):
+        self.names = names
+
+    def list_collections(self):
+        return self.names
+
+
+def per_call_us(function, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        function(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'collections':>12}{'touch us':>10}{'list us':>10}{'stats us':>10}{'sweep ms':>10}")
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp()
+        try:
+            names = [f"doc_{i}_{int(time.time())}_0123abcd" for i in range(size)]
+            referenced = {name: time.time() for name in names}
+            lifecycle = CollectionLifecycle(
+                os.path.join(workdir, "lifecycle.db"), StubStore(names), lambda name: None,
+                lambda: referenced, sweep_interval=0,
+            )
+            with lifecycle._lock:
+                lifecycle._db.executemany(
+                    "INSERT INTO collections (collection_name, created_at, last_access, size_bytes, chunks) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(name, time.time(), time.time() - i, 100_000, 50) for i, name in enumerate(names)],
+                )
+                lifecycle._db.commit()
+
+            # Half the touches are throttled repeats, like a busy collection
+            touch = per_call_us(lambda i: lifecycle.touch(names[i % (size // 2 or 1)]), min(size, 5000))
+            listing = per_call_us(lambda i: lifecycle.list(50, (i * 50) % size), 200)
+            stats = per_call_us(lambda i: lifecycle.snapshot(), 200)
+            started = time.perf_counter()
+            lifecycle.sweep()
+            sweep = (time.perf_counter() - started) * 1000
+            print(f"{size:>12}{touch:>10.1f}{listing:>10.1f}{stats:>10.1f}{sweep:>10.1f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
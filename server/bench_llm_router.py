@@ -0,0 +1,94 @@
+"""
+Exercise LLMRouter offline against mock providers: tail latency with and
+without hedging, and failover/circuit breaking during a provider outage.
+
+    python bench_llm_router.py [--requests 400] [--concurrency 8] [--stream] [--async]
+"""
+import argparse
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from llm_router import LLMRouter, LLMUnavailable, MockProvider
+
+SCENARIOS = {
+    # Fast primary that occasionally stalls, slower but steady secondary
+    "stalls": lambda: [
+        MockProvider("primary", latency=0.05, jitter=0.01, stall_rate=0.05, stall=1.0),
+        MockProvider("secondary", latency=0.12, jitter=0.02),
+    ],
+    # Primary down entirely: requests should fail over, then skip it
+    "outage": lambda: [
+        MockProvider("primary", latency=0.05, jitter=0.01, error_rate=1.0),
+        MockProvider("secondary", latency=0.12, jitter=0.02),
+    ],
+}
+
+
+def run_sync(router, requests, concurrency, stream):
+    def one(i):
+        started = time.perf_counter()
+        try:
+            if stream:
+                next(iter(router.stream(f"question {i}")))
+            else:
+                router.complete(f"question {i}")
+        except LLMUnavailable:
+            return None
+        return time.perf_counter() - started
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+def run_async(router, requests, concurrency, stream):
+    async def one(i, limit):
+        async with limit:
+            started = time.perf_counter()
+            try:
+                if stream:
+                    tokens = router.astream(f"question {i}")
+                    await tokens.__anext__()
+                    await tokens.aclose()
+                else:
+                    await router.acomplete(f"question {i}")
+            except LLMUnavailable:
+                return None
+            return time.perf_counter() - started
+
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(one(i, limit) for i in range(requests)))
+
+    return asyncio.run(main())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="measure time to first token")
+    parser.add_argument("--async", dest="use_async", action="store_true")
+    args = parser.parse_args()
+    # Simulated failures are expected; keep the table readable
+    logging.disable(logging.CRITICAL)
+    run = run_async if args.use_async else run_sync
+
+    print(f"{'scenario':<10}{'hedge':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'failed':>8}{'hedged':>8}{'failovers':>11}  circuit")
+    for name, make_providers in SCENARIOS.items():
+        for hedge in (False, True):
+            router = LLMRouter(make_providers(), hedge=hedge)
+            latencies = run(router, args.requests, args.concurrency, args.stream)
+            ok = np.array([latency for latency in latencies if latency is not None]) * 1000
+            stats = router.snapshot()
+            circuit = ", ".join(f"{provider}={state['circuit']}" for provider, state in stats["providers"].items())
+            print(f"{name:<10}{str(hedge):>7}"
+                  f"{np.percentile(ok, 50):>9.1f}{np.percentile(ok, 95):>9.1f}{np.percentile(ok, 99):>9.1f}"
+                  f"{latencies.count(None):>8}{stats['hedged']:>8}{stats['failovers']:>11}  {circuit}")
+
+
+if __name__ == "__main__":
+    main()
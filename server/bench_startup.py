@@ -0,0 +1,70 @@
+"""
+Profile what importing the app costs and check cold start against a budget.
+
+    python bench_startup.py [--module app] [--runs 5] [--budget 1.5] [--top 15]
+
+Imports --module in fresh interpreters. The first run uses -X importtime
+and prints the packages with the most self time; then the median wall time
+over --runs, minus a bare interpreter start, is compared with --budget
+(seconds) and the script exits non-zero if it is over.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def run(code, *flags):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *flags, "-c", code],
+        cwd=HERE, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        sys.exit(f"Import failed:\n{result.stderr[-2000:]}")
+    return elapsed, result.stderr
+
+
+def import_profile(stderr):
+    """Sum -X importtime self time (seconds) per top-level package."""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+    code = f"import {args.module}"
+
+    _, stderr = run(code, "-X", "importtime")
+    profile = import_profile(stderr)
+    print(f"{'package':<30}{'self s':>10}")
+    for name, seconds in profile[:args.top]:
+        print(f"{name:<30}{seconds:>10.3f}")
+    print(f"{'total':<30}{sum(seconds for _, seconds in profile):>10.3f}\n")
+
+    baseline = statistics.median(run("pass")[0] for _ in range(args.runs))
+    cold = statistics.median(run(code)[0] for _ in range(args.runs)) - baseline
+    verdict = "ok" if cold <= args.budget else "OVER BUDGET"
+    print(f"import {args.module}: {cold:.3f}s median over {args.runs} runs "
+          f"(budget {args.budget:.3f}s) {verdict}")
+    sys.exit(0 if cold <= args.budget else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Compare query latency across vector store backends on random 384-d vectors
+(the MiniLM embedding size), and the metadata-filtered get that fetches a
+hit's neighbouring chunks for the context.
+
+    python bench_vector_store.py [--sizes 1000 5000 50000] [--http]
+
+--http also benchmarks the hosted Chroma instance (needs CHROMA_API_KEY).
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+import vector_store
+from vector_store import create_vector_store
+
+try:
+    import hnswlib  # noqa: F401
+    HAVE_HNSWLIB = True
+except ImportError:
+    HAVE_HNSWLIB = False
+
+DIM = 384
+QUERIES = 200
+N_RESULTS = 4
+
+
+def bench(store, size, vectors, queries):
+    name = f"bench_{size}_{uuid.uuid4().hex[:8]}"
+    collection = store.create_collection(name=name)
+    try:
+        ids = [str(i) for i in range(size)]
+        for start in range(0, size, 1000):
+            collection.add(
+                ids=ids[start:start + 1000],
+                embeddings=vectors[start:start + 1000],
+                documents=[f"chunk {i}" for i in range(start, min(start + 1000, size))],
+                metadatas=[{"chunk_index": i, "page_number": i // 10}
+                           for i in range(start, min(start + 1000, size))],
+            )
+        collection.query(query_embeddings=queries[:1], n_results=N_RESULTS)  # warm up / build index
+        latencies = []
+        gets = []
+        for number, query in enumerate(queries):
+            started = time.perf_counter()
+            collection.query(query_embeddings=[query], n_results=N_RESULTS)
+            latencies.append((time.perf_counter() - started) * 1000)
+            # What context_builder asks for: the chunks either side of each hit
+            hits = [(number * 7919 + i * 104729) % size for i in range(N_RESULTS)]
+            started = time.perf_counter()
+            collection.get(where={"chunk_index": {"$in": sorted({h + d for h in hits for d in (-1, 1)})}},
+                           include=["documents", "metadatas"])
+            gets.append((time.perf_counter() - started) * 1000)
+        return np.percentile(latencies, 50), np.percentile(latencies, 95), np.percentile(gets, 50)
+    finally:
+        store.delete_collection(name=name)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 50000])
+    parser.add_argument("--http", action="store_true")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    backends = {
+        "local": lambda: create_vector_store("local", path=os.path.join(workdir, "local")),
+        "chroma_persistent": lambda: create_vector_store("chroma_persistent", path=os.path.join(workdir, "chroma")),
+    }
+    if args.http:
+        backends["chroma_http"] = lambda: create_vector_store(
+            "chroma_http",
+            host='api.trychroma.com',
+            tenant='c74d6ead-7a1a-4e7d-afbb-3dd8d548c5ed',
+            database='eda-database',
+            token=os.getenv('CHROMA_API_KEY'),
+        )
+
+    rng = np.random.default_rng(0)
+    print(f"{'backend':<22}{'vectors':>9}{'p50 ms':>10}{'p95 ms':>10}{'get p50 ms':>12}")
+    try:
+        for size in args.sizes:
+            vectors = rng.standard_normal((size, DIM), dtype=np.float32)
+            queries = rng.standard_normal((QUERIES, DIM), dtype=np.float32)
+            for label, make_store in backends.items():
+                try:
+                    p50, p95, get_p50 = bench(make_store(), size, vectors, queries)
+                except Exception as e:
+                    print(f"{label:<22}{size:>9}  failed: {e}")
+                    continue
+                print(f"{label:<22}{size:>9}{p50:>10.2f}{p95:>10.2f}{get_p50:>12.2f}")
+
+            if size >= vector_store.HNSW_MIN_VECTORS or not HAVE_HNSWLIB:
+                continue
+            # Force the HNSW path on smaller collections too, for comparison
+            threshold = vector_store.HNSW_MIN_VECTORS
+            vector_store.HNSW_MIN_VECTORS = 0
+            try:
+                p50, p95, get_p50 = bench(create_vector_store("local", path=os.path.join(workdir, "hnsw")),
+                                          size, vectors, queries)
+                print(f"{'local (hnsw)':<22}{size:>9}{p50:>10.2f}{p95:>10.2f}{get_p50:>12.2f}")
+            except Exception as e:
+                print(f"{'local (hnsw)':<22}{size:>9}  failed: {e}")
+            finally:
+                vector_store.HNSW_MIN_VECTORS = threshold
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from chunker import estimate_tokens
+
+WINDOW = 6  # messages read back for a prompt
+MAX_BATCH = 256
+FLUSH_INTERVAL = 0.05  # seconds a message may wait to be batched with others
+READ_RETRIES = 3
+HISTORY_TOKENS = 1000  # most of the prompt a conversation may take
+
+
+def format_history(messages, max_tokens=HISTORY_TOKENS):
+    """Render messages as "User: ..." / "Assistant: ..." lines, dropping the oldest past max_tokens."""
+    lines = []
+    used = 0
+    for message in reversed(messages):
+        speaker = "User" if message["role"] == "user" else "Assistant"
+        line = f"{speaker}: {message['content']}"
+        used += estimate_tokens(line)
+        if used > max_tokens:
+            break
+        lines.append(line)
+    return "\n".join(reversed(lines))
+
+
+class ChatHistory:
+    """
+    Conversation messages per (session, collection), in the chat_message
+    table of db_path (the app uses the repo's instance/chat.db).
+
+    append() only queues the message; a writer thread inserts whatever has
+    queued up in one transaction every FLUSH_INTERVAL, so requests never
+    wait on a SQLite write. recent() reads the last messages through the
+    (session_id, collection_name, id) index and adds this worker's queued
+    ones, so a session sees its own last turn even before it is written.
+
+    Older rows in the table (no session) are kept but never read.
+    """
+
+    def __init__(self, db_path, window=WINDOW, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.db_path = db_path
+        self.window = window
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        # Queued or being written, in queue order
+        self._pending = []
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.stats = {
+            "appended": 0,
+            "written": 0,
+            "batches": 0,
+            "write_errors": 0,
+            "reads": 0,
+            "read_ms": 0.0,
+            "max_read_ms": 0.0,
+        }
+        db = self._db()
+        db.execute(
+            """CREATE TABLE IF NOT EXISTS chat_message (
+                id INTEGER NOT NULL,
+                role VARCHAR(20) NOT NULL,
+                content TEXT NOT NULL,
+                timestamp DATETIME,
+                session_id TEXT,
+                collection_name TEXT,
+                PRIMARY KEY (id)
+            )"""
+        )
+        # The table predates sessions (it was created by SQLAlchemy)
+        columns = [row[1] for row in db.execute("PRAGMA table_info(chat_message)")]
+        for column in ("session_id", "collection_name"):
+            if column not in columns:
+                db.execute(f"ALTER TABLE chat_message ADD COLUMN {column} TEXT")
+        db.execute(
+            "CREATE INDEX IF NOT EXISTS chat_message_session_collection "
+            "ON chat_message (session_id, collection_name, id)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS chat_message_session ON chat_message (session_id, id)")
+        db.commit()
+        self._writer = threading.Thread(target=self._write_loop, name="chat-history-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _db(self):
+        # One connection per thread, so reads never wait behind the writer
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def append(self, session_id, collection_name, role, content):
+        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+        message = (role, content, timestamp, session_id, collection_name)
+        with self._lock:
+            self._pending.append(message)
+            self._queue.put(message)
+            self.stats["appended"] += 1
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(batch)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch):
+        with self._lock:
+            # Odd while committing: readers can't tell yet whether these rows are in the table
+            self._generation += 1
+        try:
+            db = self._db()
+            db.executemany(
+                "INSERT INTO chat_message (role, content, timestamp, session_id, collection_name) "
+                "VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+            db.commit()
+            written = True
+        except sqlite3.Error as e:
+            logging.error(f"Error writing {len(batch)} chat messages: {str(e)}")
+            written = False
+        with self._lock:
+            del self._pending[:len(batch)]
+            self._generation += 1
+            self.stats["batches"] += 1
+            self.stats["written" if written else "write_errors"] += len(batch)
+
+    def flush(self):
+        """Block until everything appended so far is written."""
+        self._queue.join()
+
+    def recent(self, session_id, collection_name, limit=None):
+        """The last limit messages of a session on a collection, oldest first, as {"role", "content"}."""
+        limit = limit or self.window
+        started = time.perf_counter()
+        for _ in range(READ_RETRIES):
+            with self._lock:
+                generation = self._generation
+                pending = [
+                    (role, content) for role, content, _, session, collection in self._pending
+                    if session == session_id and collection == collection_name
+                ]
+            rows = self._db().execute(
+                "SELECT role, content FROM chat_message WHERE session_id = ? AND collection_name = ? "
+                "ORDER BY id DESC LIMIT ?",
+                (session_id, collection_name, limit),
+            ).fetchall()
+            # Retry if a batch was committed meanwhile, or it could show up twice
+            if generation % 2 == 0 and generation == self._generation:
+                break
+        messages = (rows[::-1] + pending)[-limit:]
+
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.stats["reads"] += 1
+            self.stats["read_ms"] += elapsed
+            self.stats["max_read_ms"] = max(self.stats["max_read_ms"], elapsed)
+        return [{"role": role, "content": content} for role, content in messages]
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, pending=len(self._pending))
+        stats["mean_read_ms"] = stats["read_ms"] / stats["reads"] if stats["reads"] else 0.0
+        return stats
@@ -0,0 +1,224 @@
+"""
+Compare the native splitters/extraction in chunker.py and extraction.py with
+the langchain versions they replace, and time both.
+
+    python check_splitter_parity.py [--pdf handout.pdf ...] [--trials 300]
+
+CharacterTextSplitter and PyMuPDFLoader output must match exactly (exit code
+1 otherwise). NLTKTextSplitter uses the punkt model, which the native
+sentence rules only approximate, so for it the sentence-boundary agreement
+is reported instead. Comparisons whose langchain/nltk packages aren't
+installed are skipped.
+
+split_sentences() is always checked against SENTENCE_CASES (fixed inputs
+with the splits punkt gives) and KNOWN_DIFFERENCES (inputs where the
+native rules deliberately split differently from punkt); any change in
+its output fails the run. When punkt is installed its splits are checked
+against the same tables, so a punkt update that moves a boundary shows up.
+"""
+import argparse
+import logging
+import random
+import sys
+import time
+
+from chunker import split_on_separator, split_sentence_chunks, split_sentences
+from extraction import extract_document_text
+from utils import fast_text_cleanup
+
+try:
+    from langchain.text_splitter import CharacterTextSplitter, NLTKTextSplitter
+except ImportError:
+    try:
+        from langchain_text_splitters import CharacterTextSplitter, NLTKTextSplitter
+    except ImportError:
+        CharacterTextSplitter = NLTKTextSplitter = None
+
+# (text, sentences) where split_sentences and punkt agree
+SENTENCE_CASES = [
+    ("The cell divides. Each daughter cell is smaller.",
+     ["The cell divides.", "Each daughter cell is smaller."]),
+    ("Is it alive? Yes! It grows.",
+     ["Is it alive?", "Yes!", "It grows."]),
+    ("Dr. Smith measured it. The result was 3.5 J per mole.",
+     ["Dr. Smith measured it.", "The result was 3.5 J per mole."]),
+    ("Enzymes, e.g. amylase, break down starch. They are proteins.",
+     ["Enzymes, e.g. amylase, break down starch.", "They are proteins."]),
+    ('He said "stop." Then he left.',
+     ['He said "stop."', "Then he left."]),
+    ("Smith et al. reported it. Others agreed.",
+     ["Smith et al. reported it.", "Others agreed."]),
+    ("Values rose by 5 vs. 3 last year. Costs fell.",
+     ["Values rose by 5 vs. 3 last year.", "Costs fell."]),
+    ("Wait... then what happened? Nothing.",
+     ["Wait... then what happened?", "Nothing."]),
+    ("first line\nsecond line. Third.",
+     ["first line\nsecond line.", "Third."]),
+    ("Use pH 7.0 buffer.Then stir.",
+     ["Use pH 7.0 buffer.Then stir."]),
+    ("A sentence.  Another one.\n\nA new paragraph.",
+     ["A sentence.", "Another one.", "A new paragraph."]),
+]
+
+# (text, punkt sentences, native sentences) where the native rules differ
+KNOWN_DIFFERENCES = [
+    # Any single letter followed by a period is read as an initial, so a
+    # sentence ending in one ("vitamin C.", "group B.") is joined to the next
+    ("Add vitamin C. It helps.",
+     ["Add vitamin C.", "It helps."],
+     ["Add vitamin C. It helps."]),
+    # An ellipsis never ends a sentence, even before a capitalised word
+    ("Wait... Then it rained.",
+     ["Wait...", "Then it rained."],
+     ["Wait... Then it rained."]),
+]
+
+WORDS = ("the", "cell", "membrane", "dr.", "e.g.", "protein", "of", "energy", "mr.",
+         "u.s.", "and", "is", "figure", "3.5", "J.", "results")
+
+
+def random_text(rng, sentences):
+    parts = []
+    for _ in range(sentences):
+        words = rng.choices(WORDS, k=rng.randint(1, 25))
+        words[0] = words[0].capitalize()
+        parts.append(" ".join(words) + rng.choice((".", ".", "?", "!", '."')))
+        parts.append(rng.choice((" ", " ", "  ", "\n", "\n\n")))
+    return "".join(parts)
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def check_character_splitter(rng, trials):
+    if CharacterTextSplitter is None:
+        print("CharacterTextSplitter: skipped (langchain not installed)")
+        return True
+    mismatches = 0
+    native_seconds = langchain_seconds = 0.0
+    for _ in range(trials):
+        text = random_text(rng, rng.randint(1, 80))
+        if rng.random() < 0.5:
+            text = fast_text_cleanup(text)
+        separator = rng.choice(("\n\n", "\n", " ", ". "))
+        chunk_size = rng.choice((20, 100, 500, 4000))
+        chunk_overlap = rng.randint(0, chunk_size // 2)
+        expected, seconds = timed(
+            lambda: CharacterTextSplitter(separator=separator, chunk_size=chunk_size,
+                                          chunk_overlap=chunk_overlap).split_text(text))
+        langchain_seconds += seconds
+        actual, seconds = timed(split_on_separator, text, separator, chunk_size, chunk_overlap)
+        native_seconds += seconds
+        if actual != expected:
+            mismatches += 1
+            if mismatches == 1:
+                print(f"  first mismatch (separator={separator!r}, size={chunk_size}, overlap={chunk_overlap}):")
+                print(f"    langchain: {expected[:3]}")
+                print(f"    native:    {actual[:3]}")
+    print(f"CharacterTextSplitter: {trials - mismatches}/{trials} identical, "
+          f"langchain {langchain_seconds * 1000:.1f}ms, native {native_seconds * 1000:.1f}ms")
+    return mismatches == 0
+
+
+def load_punkt():
+    """nltk with a punkt model available, or None."""
+    try:
+        import nltk
+        try:
+            nltk.data.find("tokenizers/punkt_tab")
+        except LookupError:
+            nltk.data.find("tokenizers/punkt")
+    except (ImportError, LookupError):
+        return None
+    return nltk
+
+
+def check_sentence_cases():
+    nltk = load_punkt()
+    cases = [(text, expected, expected) for text, expected in SENTENCE_CASES] + KNOWN_DIFFERENCES
+    mismatches = 0
+    for text, punkt, native in cases:
+        actual = split_sentences(text)
+        if actual != native:
+            mismatches += 1
+            print(f"  split_sentences({text!r}):")
+            print(f"    expected: {native}")
+            print(f"    actual:   {actual}")
+        if nltk is not None and nltk.sent_tokenize(text) != punkt:
+            print(f"  note: punkt now splits {text!r} as {nltk.sent_tokenize(text)}, not {punkt}")
+    print(f"split_sentences: {len(cases) - mismatches}/{len(cases)} fixed cases as expected "
+          f"({len(KNOWN_DIFFERENCES)} known differences from punkt)"
+          f"{'' if nltk is not None else ', punkt not installed so its splits were not rechecked'}")
+    return mismatches == 0
+
+
+def check_sentence_splitter(rng, trials):
+    nltk = load_punkt()
+    if nltk is None:
+        print("NLTKTextSplitter: skipped (nltk or punkt not installed)")
+        return
+    if NLTKTextSplitter is None:
+        print("NLTKTextSplitter: skipped (langchain not installed)")
+        return
+    agreed = total = 0
+    identical = 0
+    native_seconds = nltk_seconds = 0.0
+    for _ in range(trials):
+        text = random_text(rng, rng.randint(1, 80))
+        expected, seconds = timed(lambda: NLTKTextSplitter().split_text(text))
+        nltk_seconds += seconds
+        actual, seconds = timed(split_sentence_chunks, text)
+        native_seconds += seconds
+        identical += actual == expected
+        reference = set(s.strip() for s in nltk.sent_tokenize(text))
+        ours = set(split_sentences(text))
+        agreed += len(reference & ours)
+        total += len(reference | ours)
+    print(f"NLTKTextSplitter: {identical}/{trials} identical, sentence agreement "
+          f"{agreed / max(total, 1):.1%}, nltk {nltk_seconds * 1000:.1f}ms, native {native_seconds * 1000:.1f}ms")
+
+
+def check_extraction(paths):
+    if not paths:
+        return True
+    try:
+        from langchain_community.document_loaders import PyMuPDFLoader
+    except ImportError:
+        print("PyMuPDFLoader: skipped (langchain-community not installed)")
+        return True
+    ok = True
+    for path in paths:
+        expected, langchain_seconds = timed(
+            lambda: "\n".join(doc.page_content for doc in PyMuPDFLoader(path).load()))
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        actual, native_seconds = timed(lambda: extract_document_text(pdf_bytes, separator="\n"))
+        same = actual == expected
+        ok &= same
+        print(f"PyMuPDFLoader {path}: {'identical' if same else 'DIFFERENT'}, "
+              f"langchain {langchain_seconds * 1000:.1f}ms, native {native_seconds * 1000:.1f}ms")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdf", nargs="*", default=[])
+    parser.add_argument("--trials", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    # langchain warns on every oversized chunk
+    logging.disable(logging.WARNING)
+
+    ok = check_character_splitter(rng, args.trials)
+    ok &= check_sentence_cases()
+    check_sentence_splitter(rng, args.trials)
+    ok &= check_extraction(args.pdf)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,21 @@
 import os
 import chromadb
 import fitz
-import spacy
 import re
-from chromadb.utils import embedding_functions
-import anthropic
 from dotenv import load_dotenv
 import json
-import requests
+from llm_clients import LLMClients
 
 
-nlp = spacy.load("en_core_web_sm")  
+_nlp = None
+
+def get_nlp():
+    # spaCy and its model take seconds to load; only pay for it when a PDF is parsed
+    global _nlp
+    if _nlp is None:
+        import spacy
+        _nlp = spacy.load("en_core_web_sm")
+    return _nlp
 
 def format_text(text:str) -> str: return text.replace("\n", " ").strip()
 
@@ -42,7 +47,7 @@ def process_text(pages_text, slice_size=6):
         try:
             if isinstance(item["text"], str):
                 # Split text into sentences
-                doc = nlp(item["text"])
+                doc = get_nlp()(item["text"])
                 item["sentences"] = [str(sentence) for sentence in list(doc.sents)]
                 item["number_sentences"] = len(item["sentences"])
 
@@ -131,9 +136,10 @@ def chroma_vector():
     print(f"Successfully created vector collection with {len(long_chunks)} chunks")
     return collection
 
-def ask_ollama(query, context):
-     
-    base_prompt = f"""
+llm_clients = LLMClients()
+
+def build_ollama_prompt(query, context):
+    return f"""
             By using the context try to answer the query of the user
 
             Context:
@@ -141,20 +147,18 @@ def ask_ollama(query, context):
 
             **User Query**: {query}
             """
-     
-    url = "http://localhost:11434/api/generate"
-
-    headers ={
-        "Content-Type": "application/json"
-    }
 
+def ask_ollama(query, context):
+     
+    base_prompt = build_ollama_prompt(query, context)
+     
     data = {
         "model":"llama3.2",
         "prompt": base_prompt,
         "stream": False,
     }
 
-    response = requests.post(url, headers=headers, data=json.dumps(data))
+    response = llm_clients.ollama.post(data)
 
     if response.status_code==200:
         # take the response and return only the answer
@@ -0,0 +1,203 @@
+import re
+import zlib
+from collections import deque
+
+# Same boundary rule as split_text_into_sentences in app.py
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# With content-defined boundaries, about one sentence in ANCHOR_EVERY may end
+# a window once it is ANCHOR_FILL full (chunks come out ~2% smaller on average)
+ANCHOR_EVERY = 4
+ANCHOR_FILL = 0.85
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def _split_long(text, size):
+    """Split text into pieces of at most size characters, on spaces where possible."""
+    while len(text) > size:
+        cut = text.rfind(" ", 0, size + 1)
+        if cut <= 0:
+            cut = size
+        yield text[:cut].strip()
+        text = text[cut:].strip()
+    if text:
+        yield text
+
+
+def iter_sentences(pages, max_sentence_chars=CHUNK_SIZE):
+    """
+    Yield (sentence, page_number) from pages of cleaned text.
+
+    A sentence that runs over a page break is attributed to the page it
+    started on. Anything longer than max_sentence_chars is split so a page
+    without punctuation can't grow the buffer without bound.
+    """
+    carry = ""
+    carry_page = None
+    for page in pages:
+        text = page["text"]
+        if not text:
+            continue
+        if carry:
+            text = carry + " " + text
+        else:
+            carry_page = page["page_number"]
+
+        sentences = _SENTENCE_END_RE.split(text)
+        # The last piece may continue on the next page
+        carry = sentences.pop()
+        for sentence in sentences:
+            sentence = sentence.strip()
+            if sentence:
+                for piece in _split_long(sentence, max_sentence_chars):
+                    yield piece, carry_page
+            carry_page = page["page_number"]
+
+        if len(carry) > max_sentence_chars:
+            pieces = list(_split_long(carry, max_sentence_chars))
+            carry = pieces.pop()
+            for piece in pieces:
+                yield piece, carry_page
+
+    carry = carry.strip()
+    if carry:
+        yield carry, carry_page
+
+
+def _is_anchor(sentence):
+    return zlib.crc32(sentence.encode("utf-8")) % ANCHOR_EVERY == 0
+
+
+def iter_chunks(pages, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, length_function=len,
+                content_defined=False):
+    """
+    Pack sentences from pages into windows of at most chunk_size (measured
+    with length_function, e.g. len or estimate_tokens), repeating up to
+    chunk_overlap worth of trailing sentences at the start of the next window.
+
+    Yields {"text", "chunk_index", "page_number", "page_end"} as soon as each
+    window is full, so memory is bounded by the window rather than the document.
+
+    With content_defined, a window also ends early (once ANCHOR_FILL full)
+    after an "anchor" sentence picked by hashing its text. Purely greedy
+    windows after an edit stay shifted for many pages; anchored ones line
+    up with the old windows again at the next anchor, so an edited document
+    produces mostly the same chunks as before.
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+
+    # Sentences are split on characters; make sure one always fits a window
+    max_sentence_chars = chunk_size * 4 if length_function is estimate_tokens else chunk_size
+    window = deque()
+    window_length = 0
+    chunk_index = 0
+    has_new = False
+
+    def emit():
+        return {
+            "text": " ".join(sentence for sentence, _, _ in window),
+            "chunk_index": chunk_index,
+            "page_number": window[0][1],
+            "page_end": window[-1][1],
+        }
+
+    for sentence, page_number in iter_sentences(pages, max_sentence_chars):
+        length = length_function(sentence) + 1
+        if has_new and window_length + length > chunk_size:
+            yield emit()
+            chunk_index += 1
+            has_new = False
+            # Keep the tail of the window as overlap for the next chunk
+            while window and (window_length > chunk_overlap or window_length + length > chunk_size):
+                window_length -= window.popleft()[2]
+        window.append((sentence, page_number, length))
+        window_length += length
+        has_new = True
+        if content_defined and window_length >= chunk_size * ANCHOR_FILL and _is_anchor(sentence):
+            yield emit()
+            chunk_index += 1
+            has_new = False
+            while window and window_length > chunk_overlap:
+                window_length -= window.popleft()[2]
+
+    if has_new:
+        yield emit()
+
+
+# Drop-in replacements for the langchain splitters the older helpers used
+# (CharacterTextSplitter, NLTKTextSplitter). check_splitter_parity.py
+# compares them against langchain.
+
+# Abbreviations and initials whose trailing period doesn't end a sentence
+_ABBREVIATION_RE = re.compile(
+    r'(?:\b(?:mr|mrs|ms|dr|prof|sr|jr|st|mt|vs|etc|fig|figs|eq|no|vol|pp|al|inc|ltd|co|dept|approx)'
+    r'|\b(?:e\.g|i\.e|a\.m|p\.m|u\.s)|\b[a-z])\.$',
+    re.IGNORECASE,
+)
+# A sentence ends at . ! or ? (plus closing quotes/brackets) followed by whitespace
+_SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?])(?<!\.\.\.)["\')\]]*\s+')
+
+
+def split_sentences(text):
+    """
+    Split text into sentences with punkt-like rules, without loading a model.
+
+    Unlike punkt, a single letter followed by a period is always taken as an
+    initial and an ellipsis never ends a sentence; check_splitter_parity.py
+    pins these and the cases where both agree.
+    """
+    sentences = []
+    start = 0
+    for match in _SENTENCE_BOUNDARY_RE.finditer(text):
+        if _ABBREVIATION_RE.search(text, max(start, match.start() - 12), match.start()):
+            continue
+        if text[start:match.start()].strip():
+            sentences.append(text[start:match.end()].strip())
+        start = match.end()
+    if text[start:].strip():
+        sentences.append(text[start:].strip())
+    return sentences
+
+
+def merge_splits(splits, separator, chunk_size, chunk_overlap, length_function=len):
+    """
+    Pack splits into chunks of at most chunk_size joined by separator,
+    carrying up to chunk_overlap of trailing splits into the next chunk.
+    Same rule as langchain's TextSplitter._merge_splits, so output matches.
+    """
+    separator_length = length_function(separator)
+    chunks = []
+    current = deque()
+    total = 0
+    for split in splits:
+        length = length_function(split)
+        if current and total + length + separator_length > chunk_size:
+            chunk = separator.join(current).strip()
+            if chunk:
+                chunks.append(chunk)
+            while total > chunk_overlap or (total and total + length + (separator_length if current else 0) > chunk_size):
+                total -= length_function(current.popleft()) + (separator_length if len(current) else 0)
+        current.append(split)
+        total += length + (separator_length if len(current) > 1 else 0)
+    chunk = separator.join(current).strip()
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
+def split_on_separator(text, separator="\n\n", chunk_size=4000, chunk_overlap=200):
+    """CharacterTextSplitter.split_text: split on separator, then merge_splits."""
+    splits = text.split(separator) if separator else list(text)
+    return merge_splits([s for s in splits if s], separator, chunk_size, chunk_overlap)
+
+
+def split_sentence_chunks(text, separator="\n\n", chunk_size=4000, chunk_overlap=200):
+    """NLTKTextSplitter.split_text: sentences merged into chunks of chunk_size."""
+    return merge_splits(split_sentences(text), separator, chunk_size, chunk_overlap)
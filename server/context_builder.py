@@ -0,0 +1,104 @@
+import logging
+import threading
+
+from chunker import estimate_tokens
+
+# Prompt tokens we are willing to spend on document/context per model. Well
+# under the context windows, mostly to keep prefill (and Groq TPM limits) sane.
+CONTEXT_BUDGETS = {
+    "llama-3.3-70b-versatile": 6000,
+    "Meta-Llama-3.3-70B-Instruct": 6000,
+    "llama3.2": 3000,
+}
+DEFAULT_BUDGET = 4000
+
+_stats_lock = threading.Lock()
+prompt_stats = {
+    "requests": 0,
+    "prompt_tokens": 0,
+    "max_prompt_tokens": 0,
+}
+
+
+def budget_for(model, overhead=0):
+    """Tokens left for context/document once the prompt template is accounted for."""
+    return max(CONTEXT_BUDGETS.get(model, DEFAULT_BUDGET) - overhead, 0)
+
+
+def _truncate(text, tokens):
+    """Cut text to roughly tokens tokens, on a word boundary."""
+    limit = tokens * 4
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > 0 else limit]
+
+
+def _neighbour_chunks(collection, chunk_indexes):
+    if not chunk_indexes:
+        return []
+    try:
+        found = collection.get(
+            where={"chunk_index": {"$in": sorted(chunk_indexes)}},
+            include=["documents", "metadatas"],
+        )
+    except Exception as e:
+        logging.error(f"Error fetching neighbouring chunks: {str(e)}")
+        return []
+    return [(meta["chunk_index"], text) for text, meta in zip(found["documents"], found["metadatas"])]
+
+
+def build_context(results, budget, collection=None, document=None):
+    """
+    Assemble (context, document_head, tokens) for a prompt from a collection.query
+    result, spending at most budget estimated tokens.
+
+    Chunks are taken in order of priority - the retrieved top-k, then their
+    neighbouring chunks - and put back in document order. Whatever budget
+    is left goes to the document head: the start of the document, cut
+    where the budget runs out. It is not a summary of the document.
+    """
+    texts = results["documents"][0] if results.get("documents") else []
+    metadatas = (results.get("metadatas") or [[]])[0] or [None] * len(texts)
+
+    selected = {}
+    used = 0
+    for rank, (text, meta) in enumerate(zip(texts, metadatas)):
+        tokens = estimate_tokens(text)
+        if used + tokens > budget:
+            break
+        key = meta.get("chunk_index", rank) if meta else rank
+        selected[key] = text
+        used += tokens
+
+    if collection is not None and used < budget:
+        wanted = set()
+        for key in list(selected):
+            wanted.update((key - 1, key + 1))
+        wanted = {index for index in wanted if index >= 0} - set(selected)
+        for index, text in _neighbour_chunks(collection, wanted):
+            tokens = estimate_tokens(text)
+            if used + tokens > budget:
+                continue
+            selected[index] = text
+            used += tokens
+
+    context = "\n".join(selected[key] for key in sorted(selected))
+
+    document_head = ""
+    if document and used < budget:
+        document_head = _truncate(document, budget - used)
+        used += estimate_tokens(document_head)
+
+    return context, document_head, used
+
+
+def record_prompt(prompt, model):
+    """Count a prompt's estimated tokens toward the prefill stats and return them."""
+    tokens = estimate_tokens(prompt)
+    with _stats_lock:
+        prompt_stats["requests"] += 1
+        prompt_stats["prompt_tokens"] += tokens
+        prompt_stats["max_prompt_tokens"] = max(prompt_stats["max_prompt_tokens"], tokens)
+    logging.info(f"Prompt for {model}: ~{tokens} tokens")
+    return tokens
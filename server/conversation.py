@@ -0,0 +1,193 @@
+import logging
+import re
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from chat_history import format_history
+from chunker import estimate_tokens
+
+WINDOW = 4  # turns remembered per session
+MAX_SESSIONS = 2000
+# Condensed queries at least this similar retrieve the same chunks
+REUSE_THRESHOLD = 0.95
+# Longest condensed query built by the rules; older words drop off the front
+MAX_QUERY_WORDS = 40
+
+_WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+# Pronouns that point back into the conversation rather than at the document
+_REFERRING = frozenset("""
+    it its it's itself that this these those they them their theirs themselves
+""".split())
+# ...unless followed by a noun of their own ("this paper")
+_DETERMINERS = frozenset("this that these those".split())
+# Words that say how to answer rather than what to look up
+_FILLER = frozenset("""
+    a an the and or but so then of in on at to for with about from by as into than
+    is are was were be been being do does did can could would should will shall may might must
+    i me my we us our you your he she him her his what which who whom whose when where why how
+    please explain elaborate clarify simplify describe tell show give say mean means meant
+    again more less simpler simple easier detail details detailed further other some any
+    example examples instance use using like just also really very thanks thank ok okay
+    yes no not now way kind sort there one ones same another else above earlier previous
+""".split()) | _REFERRING
+
+CONDENSE_PROMPT = """Rewrite the final question as a short standalone search query for the document, \
+resolving words like "it" or "that" from the conversation. Reply with the query only.
+
+Conversation:
+{conversation}
+
+Final question: {question}
+Standalone query:"""
+
+
+def is_follow_up(question):
+    """
+    A question that says nothing new on its own ("why?", "explain that
+    again") or is dominated by pronouns pointing back into the conversation:
+    at least one for every two content words, so "what about its role in
+    plants" is a follow-up but "give an example of osmosis" and "what does
+    this paper conclude about enzymes" are not.
+    """
+    words = _WORD_RE.findall(question.lower())
+    content = [word for word in words if word not in _FILLER]
+    referring = sum(
+        1 for i, word in enumerate(words)
+        if word in _REFERRING
+        and not (word in _DETERMINERS and i + 1 < len(words) and words[i + 1] not in _FILLER)
+    )
+    return not content or 2 * referring >= len(content)
+
+
+def content_words(question):
+    return [word for word in _WORD_RE.findall(question.lower()) if word not in _FILLER]
+
+
+def condense_with_rules(question, previous_query):
+    """
+    The previous standalone query plus whatever the follow-up adds, so
+    "explain that again with an example" retrieves exactly what the last
+    turn did and "what about its role in plants" adds "role plants".
+    """
+    added = content_words(question)
+    if not added:
+        return previous_query
+    words = f"{previous_query} {' '.join(added)}".split()
+    return " ".join(words[-MAX_QUERY_WORDS:])
+
+
+class Conversations:
+    """
+    Conversation-aware retrieval: a rolling window of each session's recent
+    turns (question, standalone query, its embedding, the chunks retrieved)
+    kept in memory, least recently used sessions first out.
+
+    condense() turns a follow-up into a standalone retrieval query, with
+    the rules above or, given complete(prompt) -> text, by asking the LLM
+    (only for questions that look like follow-ups). reuse() hands back the
+    chunks of an earlier turn in the window whose query embedding is at
+    least reuse_threshold similar, so no retrieval is needed.
+
+    Token savings are counted against condensing every question that has
+    history with the LLM, as condense-question chains usually do.
+    """
+
+    def __init__(self, window=WINDOW, max_sessions=MAX_SESSIONS, reuse_threshold=REUSE_THRESHOLD, complete=None):
+        self.window = window
+        self.max_sessions = max_sessions
+        self.reuse_threshold = reuse_threshold
+        self.complete = complete
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {
+            "sessions": 0,
+            "turns": 0,
+            "follow_ups": 0,
+            "retrievals": 0,
+            "retrievals_reused": 0,
+            "condense_calls": 0,
+            "condense_tokens": 0,
+            "condense_tokens_saved": 0,
+        }
+
+    def _turns(self, session_id, collection_name):
+        key = (session_id, collection_name)
+        turns = self._sessions.get(key)
+        if turns is None:
+            turns = self._sessions[key] = deque(maxlen=self.window)
+            self.stats["sessions"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(key)
+        return turns
+
+    def condense(self, session_id, collection_name, question, messages):
+        """
+        Standalone retrieval query for question. messages are the session's
+        recent chat history (oldest first), used when this worker hasn't
+        seen the session's earlier turns.
+        """
+        with self._lock:
+            turns = self._turns(session_id, collection_name)
+            previous_query = turns[-1]["query"] if turns else None
+        if previous_query is None:
+            previous_query = next((m["content"] for m in reversed(messages) if m["role"] == "user"), None)
+        if previous_query is None:
+            return question
+
+        conversation = format_history(messages) if messages else f"User: {previous_query}"
+        prompt = CONDENSE_PROMPT.format(conversation=conversation, question=question)
+        if not is_follow_up(question):
+            self._count(condense_tokens_saved=estimate_tokens(prompt))
+            return question
+        self._count(follow_ups=1)
+
+        if self.complete is None:
+            self._count(condense_tokens_saved=estimate_tokens(prompt))
+            return condense_with_rules(question, previous_query)
+        try:
+            query = self.complete(prompt).strip().strip('"')
+        except Exception as e:
+            logging.error(f"Condensing follow-up failed, using rules: {str(e)}")
+            return condense_with_rules(question, previous_query)
+        self._count(condense_calls=1, condense_tokens=estimate_tokens(prompt) + estimate_tokens(query))
+        return query or condense_with_rules(question, previous_query)
+
+    def reuse(self, session_id, collection_name, embedding):
+        """Chunks retrieved for a near-identical query earlier in the window, or None."""
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock:
+            turns = self._sessions.get((session_id, collection_name), ())
+            for turn in reversed(turns):
+                if float(turn["embedding"] @ vector) >= self.reuse_threshold:
+                    return turn["results"]
+        return None
+
+    def remember(self, session_id, collection_name, question, query, embedding, results, reused=False):
+        vector = np.asarray(embedding, dtype=np.float32)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        with self._lock:
+            self._turns(session_id, collection_name).append({
+                "question": question,
+                "query": query,
+                "embedding": vector,
+                "results": results,
+            })
+            self.stats["turns"] += 1
+            self.stats["retrievals_reused" if reused else "retrievals"] += 1
+
+    def _count(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self.stats[name] += value
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, active_sessions=len(self._sessions))
+        sessions = max(stats["sessions"], 1)
+        stats["retrievals_saved_per_session"] = stats["retrievals_reused"] / sessions
+        stats["tokens_saved_per_session"] = stats["condense_tokens_saved"] / sessions
+        return stats
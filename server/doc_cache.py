@@ -0,0 +1,108 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+MAX_MEMORY_BYTES = 64 * 1024 * 1024  # 64MB
+
+
+class DocumentCache:
+    """
+    Full document text per collection, so /search doesn't have to pull every
+    chunk back out of Chroma with collection.get().
+
+    Texts are written to spill_dir when stored (other workers read them from
+    there) and kept in memory up to max_bytes, least recently used first out.
+    A memory hit is checked against the file's mtime, so a document updated
+    in place by another worker is read again.
+    """
+
+    def __init__(self, spill_dir, max_bytes=MAX_MEMORY_BYTES):
+        self.spill_dir = spill_dir
+        self.max_bytes = max_bytes
+        os.makedirs(spill_dir, exist_ok=True)
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bytes_avoided": 0,
+        }
+
+    def _path(self, collection_name):
+        digest = hashlib.sha1(collection_name.encode()).hexdigest()
+        return os.path.join(self.spill_dir, f"{digest}.txt")
+
+    def _mtime(self, collection_name):
+        try:
+            return os.stat(self._path(collection_name)).st_mtime_ns
+        except OSError:
+            return None
+
+    def _remember(self, collection_name, text, mtime):
+        size = len(text.encode())
+        if size > self.max_bytes:
+            return
+        old = self._memory.pop(collection_name, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        self._memory[collection_name] = (text, size, mtime)
+        self._memory_bytes += size
+        while self._memory_bytes > self.max_bytes:
+            _, (_, evicted_size, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def put(self, collection_name, text):
+        path = self._path(collection_name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"Error writing document cache for {collection_name}: {str(e)}")
+        mtime = self._mtime(collection_name)
+        with self._lock:
+            self._remember(collection_name, text, mtime)
+
+    def get(self, collection_name):
+        """Return the cached text, or None (counted as a miss) if it isn't cached."""
+        mtime = self._mtime(collection_name)
+        with self._lock:
+            entry = self._memory.get(collection_name)
+            if entry is not None and entry[2] == mtime:
+                self._memory.move_to_end(collection_name)
+                self.stats["memory_hits"] += 1
+                self.stats["bytes_avoided"] += entry[1]
+                return entry[0]
+
+        try:
+            with open(self._path(collection_name), encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        with self._lock:
+            self._remember(collection_name, text, mtime)
+            self.stats["disk_hits"] += 1
+            self.stats["bytes_avoided"] += len(text.encode())
+        return text
+
+    def discard(self, collection_name):
+        with self._lock:
+            entry = self._memory.pop(collection_name, None)
+            if entry is not None:
+                self._memory_bytes -= entry[1]
+        try:
+            os.remove(self._path(collection_name))
+        except OSError:
+            pass
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, memory_entries=len(self._memory), memory_bytes=self._memory_bytes)
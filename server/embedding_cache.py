@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+MAX_BYTES = 512 * 1024 * 1024  # 512MB of vectors
+# Check the size limit every this many inserts rather than on every batch
+EVICT_EVERY = 1000
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache: (model name, chunk text hash) -> float32 vector,
+    stored as BLOBs in SQLite. Least recently used vectors are evicted once
+    the table holds more than max_bytes of vectors.
+    """
+
+    def __init__(self, db_path, model_name, max_bytes=MAX_BYTES):
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        self._db.commit()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+        }
+
+    def _key(self, text):
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode()).digest()
+
+    def get_many(self, texts):
+        """Return {index: vector} for the texts that are cached."""
+        keys = [self._key(text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._db.commit()
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(keys) - len(found)
+        return {
+            index: np.frombuffer(found[key], dtype=np.float32)
+            for index, key in enumerate(keys)
+            if key in found
+        }
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        rows = [
+            (self._key(text), np.asarray(vector, dtype=np.float32).tobytes(), now)
+            for text, vector in zip(texts, vectors)
+        ]
+        with self._lock:
+            try:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)", rows)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error writing embedding cache: {str(e)}")
+                return
+            self._inserts += len(rows)
+            if self._inserts >= EVICT_EVERY:
+                self._inserts = 0
+                self._evict(len(rows[0][1]) if rows else 0)
+
+    def _evict(self, vector_bytes):
+        if not vector_bytes:
+            return
+        keep = self.max_bytes // vector_bytes
+        self._db.execute(
+            "DELETE FROM embeddings WHERE key IN ("
+            "SELECT key FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (keep,),
+        )
+        self._db.commit()
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, hit_rate=self.stats["hits"] / lookups if lookups else 0.0)
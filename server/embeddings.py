@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+MAX_BATCH = 64
+MAX_WAIT = 0.01  # seconds to wait for more texts before running a partial batch
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def _default_model():
+    # Same ONNX MiniLM model Chroma embeds with by default, so vectors stay
+    # comparable with collections created before this engine existed
+    from chromadb.utils import embedding_functions
+    return embedding_functions.DefaultEmbeddingFunction()
+
+
+class EmbeddingEngine:
+    """
+    One embedding model per worker process, shared by ingest jobs and queries.
+
+    embed() calls from any thread are queued and a single background thread
+    runs them through the model in batches of up to max_batch texts, waiting
+    at most max_wait for a batch to fill. Results are float32 NumPy arrays.
+    Texts found in cache (an EmbeddingCache) skip the model entirely.
+
+    embed(texts, urgent=True) is for queries: those texts have their own
+    queue, taken before any ingest texts when a batch is put together, so
+    a search waits for at most the batch already running, not for every
+    ingest text queued ahead of it.
+    """
+
+    def __init__(self, model=None, max_batch=MAX_BATCH, max_wait=MAX_WAIT, cache=None):
+        self._model = model
+        self.cache = cache
+        self._model_lock = threading.Lock()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._urgent = deque()
+        self._requests = deque()
+        self._queued = threading.Condition()
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            "texts": 0,
+            "urgent_texts": 0,
+            "batches": 0,
+            "seconds": 0.0,
+        }
+        self._worker = threading.Thread(target=self._run, name="embedding-engine", daemon=True)
+        self._worker.start()
+
+    @property
+    def model(self):
+        # Loaded on first use: the ONNX session is a few hundred ms to build
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = _default_model()
+        return self._model
+
+    def embed(self, texts, urgent=False):
+        """Embed a list of texts; returns a (len(texts), dim) float32 array."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        if self.cache is None:
+            return self._embed_uncached(texts, urgent)
+
+        vectors = self.cache.get_many(texts)
+        missing = [index for index in range(len(texts)) if index not in vectors]
+        if missing:
+            fresh = self._embed_uncached([texts[index] for index in missing], urgent)
+            self.cache.put_many([texts[index] for index in missing], fresh)
+            vectors.update(zip(missing, fresh))
+        return np.vstack([vectors[index] for index in range(len(texts))])
+
+    def _embed_uncached(self, texts, urgent=False):
+        futures = []
+        with self._queued:
+            for start in range(0, len(texts), self.max_batch):
+                future = Future()
+                (self._urgent if urgent else self._requests).append((texts[start:start + self.max_batch], future))
+                futures.append(future)
+            self._queued.notify()
+        return np.vstack([future.result() for future in futures])
+
+    def _next_batch(self):
+        # Urgent requests first, then ingest texts to fill the batch; a request
+        # that doesn't fit waits for the next batch
+        pending = []
+        size = urgent = 0
+        for requests in (self._urgent, self._requests):
+            while requests and (not pending or size + len(requests[0][0]) <= self.max_batch):
+                request = requests.popleft()
+                pending.append(request)
+                size += len(request[0])
+                urgent += len(request[0]) if requests is self._urgent else 0
+        return pending, urgent
+
+    def _run(self):
+        while True:
+            with self._queued:
+                while not self._urgent and not self._requests:
+                    self._queued.wait()
+                deadline = time.monotonic() + self.max_wait
+                # Keep collecting until the batch is full or we've waited long enough
+                while sum(len(batch) for batch, _ in self._urgent) + \
+                        sum(len(batch) for batch, _ in self._requests) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._queued.wait(remaining):
+                        break
+                pending, urgent = self._next_batch()
+
+            texts = [text for batch, _ in pending for text in batch]
+            started = time.perf_counter()
+            try:
+                vectors = np.asarray(self.model(texts), dtype=np.float32)
+            except Exception as e:
+                logging.error(f"Embedding batch of {len(texts)} failed: {str(e)}")
+                for _, future in pending:
+                    future.set_exception(e)
+                continue
+            elapsed = time.perf_counter() - started
+
+            with self._stats_lock:
+                self.stats["texts"] += len(texts)
+                self.stats["urgent_texts"] += urgent
+                self.stats["batches"] += 1
+                self.stats["seconds"] += elapsed
+
+            offset = 0
+            for batch, future in pending:
+                future.set_result(vectors[offset:offset + len(batch)])
+                offset += len(batch)
+
+    def snapshot(self):
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["chunks_per_second"] = stats["texts"] / stats["seconds"] if stats["seconds"] else 0.0
+        stats["mean_batch"] = stats["texts"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
@@ -0,0 +1,123 @@
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Documents with fewer pages than this are parsed on the calling thread,
+# spinning up a process pool costs more than it saves for short handouts
+PARALLEL_MIN_PAGES = 32
+PAGES_PER_TASK = 16
+
+# Each pool worker opens the shared bytes once and keeps the handle around
+_worker_doc = None
+
+
+def _init_worker(pdf_bytes):
+    global _worker_doc
+    import fitz
+    _worker_doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+
+
+def _extract_range(start, stop):
+    """Extract pages [start, stop) from the worker's document."""
+    pages = []
+    for page_number in range(start, stop):
+        started = time.perf_counter()
+        text = _worker_doc[page_number].get_text()
+        pages.append({
+            "page_number": page_number + 1,
+            "text": text,
+            "elapsed": time.perf_counter() - started,
+        })
+    return pages
+
+
+def _extract_serial(doc):
+    for page_number, page in enumerate(doc):
+        started = time.perf_counter()
+        text = page.get_text()
+        yield {
+            "page_number": page_number + 1,
+            "text": text,
+            "elapsed": time.perf_counter() - started,
+        }
+
+
+def extract_pages(pdf_bytes, max_workers=None, pages_per_task=PAGES_PER_TASK):
+    """
+    Yield {"page_number", "text", "elapsed"} for every page of a PDF, in page order.
+
+    Large documents are split into page ranges and parsed by a process pool, each
+    worker reopening the same bytes. Pages are yielded as soon as their range is
+    done so callers can start cleaning/chunking before the last page is parsed.
+    Only max_workers * 2 ranges are in flight at once, the next one submitted as
+    each is yielded, so a slow consumer holds a few ranges of text, not the
+    whole document.
+    """
+    # Imported here, not at module level, so starting a worker doesn't load PyMuPDF
+    import fitz
+    if hasattr(pdf_bytes, "getvalue"):
+        pdf_bytes = pdf_bytes.getvalue()
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        page_count = doc.page_count
+        if page_count < PARALLEL_MIN_PAGES or max_workers == 1:
+            yield from _extract_serial(doc)
+            return
+
+    max_workers = max_workers or min(os.cpu_count() or 1, 4)
+    ranges = iter([(start, min(start + pages_per_task, page_count))
+                   for start in range(0, page_count, pages_per_task)])
+
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_worker,
+                             initargs=(pdf_bytes,)) as pool:
+        futures = deque()
+
+        def submit_next():
+            page_range = next(ranges, None)
+            if page_range is not None:
+                futures.append(pool.submit(_extract_range, *page_range))
+
+        for _ in range(max_workers * 2):
+            submit_next()
+        try:
+            while futures:
+                pages = futures.popleft().result()
+                submit_next()
+                yield from pages
+        finally:
+            # Generator closed early (or failed) - don't wait on pages nobody wants
+            for future in futures:
+                future.cancel()
+
+
+def log_extraction(pages):
+    """Pass pages from extract_pages through, logging the total and slowest page once they run out."""
+    started = time.perf_counter()
+    count = 0
+    slowest = None
+    for page in pages:
+        count += 1
+        if slowest is None or page["elapsed"] > slowest["elapsed"]:
+            slowest = page
+        yield page
+    if slowest:
+        logging.info(
+            f"Extracted {count} pages in {time.perf_counter() - started:.2f}s "
+            f"(slowest page {slowest['page_number']}: {slowest['elapsed'] * 1000:.1f}ms)"
+        )
+
+
+def extract_document_text(pdf_bytes, separator="", **kwargs):
+    """Extract the whole document as one string (pages joined by separator), logging per-page timing."""
+    return separator.join(page["text"] for page in log_extraction(extract_pages(pdf_bytes, **kwargs)))
+
+
+def count_pages(pdf_bytes):
+    import fitz
+    if hasattr(pdf_bytes, "getvalue"):
+        pdf_bytes = pdf_bytes.getvalue()
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return doc.page_count
@@ -0,0 +1,24 @@
+"""
+Gunicorn settings, picked up from the working directory (nixpacks starts
+gunicorn in /app).
+
+Heavy third-party libraries are imported once here, in the master, so forked
+workers inherit them copy-on-write instead of each importing them again. The
+app itself is not preloaded: it opens SQLite handles and starts threads,
+which must not be shared across a fork.
+"""
+import importlib
+import logging
+import os
+
+# Comma-separated; set GUNICORN_PRELOAD_MODULES="" to turn this off
+PRELOAD_MODULES = os.getenv(
+    'GUNICORN_PRELOAD_MODULES',
+    'flask,flask_cors,numpy,fitz,httpx,groq,openai,chromadb',
+).split(',')
+
+for module in filter(None, (name.strip() for name in PRELOAD_MODULES)):
+    try:
+        importlib.import_module(module)
+    except ImportError as e:
+        logging.warning(f"Could not preload {module}: {str(e)}")
@@ -0,0 +1,262 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_IN_FLIGHT = 3  # concurrent upserts per ingest
+TARGET_BATCH_BYTES = 2 * 1024 * 1024  # estimated request payload per upsert
+FIRST_BATCH = 32  # small, so the first upsert starts early
+MIN_BATCH = 8
+MAX_BATCH = 500
+MAX_RETRIES = 3
+BACKOFF = 0.5  # seconds, doubled per retry
+# Chroma's HTTP API sends embeddings as JSON numbers
+BYTES_PER_DIMENSION = 20
+
+_stats_lock = threading.Lock()
+ingest_stats = {
+    "documents": 0,
+    "megabytes": 0.0,
+    "seconds": 0.0,
+    "upsert_batches": 0,
+    "upsert_retries": 0,
+    "chunks_embedded": 0,
+    "chunks_reused": 0,
+    "chunks_deleted": 0,
+}
+
+
+def record_ingest(size_bytes, seconds, writer):
+    """Count a finished ingest toward the throughput stats and return its seconds per MB."""
+    megabytes = size_bytes / (1024 * 1024)
+    with _stats_lock:
+        ingest_stats["documents"] += 1
+        ingest_stats["megabytes"] += megabytes
+        ingest_stats["seconds"] += seconds
+        ingest_stats["upsert_batches"] += writer.stats["batches"]
+        ingest_stats["upsert_retries"] += writer.stats["retries"]
+        ingest_stats["chunks_embedded"] += writer.stats["chunks"]
+        ingest_stats["chunks_reused"] += writer.stats["reused"]
+        ingest_stats["chunks_deleted"] += writer.stats["deleted"]
+    seconds_per_mb = seconds / max(megabytes, 1e-6)
+    logging.info(
+        f"Ingested {megabytes:.2f}MB in {seconds:.2f}s ({seconds_per_mb:.2f}s/MB, "
+        f"{writer.stats['chunks']} chunks embedded, {writer.stats['reused']} reused, "
+        f"{writer.stats['deleted']} deleted, {writer.stats['batches']} upserts, embed {writer.stats['embed_seconds']:.2f}s, "
+        f"upsert {writer.stats['upsert_seconds']:.2f}s)"
+    )
+    return seconds_per_mb
+
+
+def ingest_snapshot():
+    with _stats_lock:
+        stats = dict(ingest_stats)
+    stats["seconds_per_mb"] = stats["seconds"] / stats["megabytes"] if stats["megabytes"] else 0.0
+    return stats
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+
+
+def chunk_id(document_key, text, occurrence=1, digest=None):
+    """
+    Content-addressed id for a chunk: the same text in the same document
+    always gets the same id, wherever it moves to, so a retried upsert
+    overwrites instead of duplicating and a re-ingest can tell which chunks
+    it already has. occurrence tells repeated identical chunks apart;
+    digest is text_hash(text) when the caller already has it.
+    """
+    suffix = f"-{occurrence}" if occurrence > 1 else ""
+    return f"{document_key}-{digest or text_hash(text)}{suffix}"
+
+
+def with_chunk_ids(chunks, document_key):
+    """Set chunk["id"] on each chunk as it streams past (see chunk_id)."""
+    document_key = hashlib.sha256(document_key.encode("utf-8")).hexdigest()[:16]
+    # Counted by hash, so no chunk's text is kept past its batch
+    seen = Counter()
+    for chunk in chunks:
+        digest = text_hash(chunk["text"])
+        seen[digest] += 1
+        chunk["id"] = chunk_id(document_key, chunk["text"], seen[digest], digest)
+        yield chunk
+
+
+def chunk_metadata(chunk):
+    return {
+        "page_number": chunk["page_number"],
+        "page_end": chunk["page_end"],
+        "chunk_index": chunk["chunk_index"],
+    }
+
+
+class IngestWriter:
+    """
+    Streams chunks into a collection with embedding and upserting overlapped.
+
+    add() buffers chunks; each full batch is embedded on the calling thread
+    and then upserted on a small pool, so batch N+1 is embedded while batch
+    N is on the wire. At most max_in_flight upserts are outstanding; add()
+    blocks beyond that. Batch size adapts to keep each request near
+    target_bytes, never above the server's max batch size, and halves after
+    a failed upsert, whose chunks are retried in two halves. Upserts use ids
+    from id_for(chunk), so a retried batch can't leave duplicates.
+
+    With max_in_flight=0 every batch is upserted inline (no overlap).
+
+    For an incremental ingest, existing maps the ids already in the
+    collection to their metadata. Chunks whose id is there are not embedded
+    again, only their metadata is updated if they moved, and flush() deletes
+    the stored ids that didn't come up this time.
+    """
+
+    def __init__(self, collection, embed, id_for, lexical=None, max_in_flight=MAX_IN_FLIGHT,
+                 target_bytes=TARGET_BATCH_BYTES, max_batch=None, max_retries=MAX_RETRIES, existing=None):
+        self.collection = collection
+        self.embed = embed
+        self.id_for = id_for
+        self.lexical = lexical
+        self.max_in_flight = max_in_flight
+        self.target_bytes = target_bytes
+        self.max_batch = max_batch or MAX_BATCH
+        self.max_retries = max_retries
+        self.existing = existing or {}
+        self._kept = set()
+        self._moved = []
+        self.batch_size = min(FIRST_BATCH, self.max_batch)
+        self._buffer = []
+        self._futures = []
+        self._slots = threading.Semaphore(max(max_in_flight, 1))
+        self._pool = ThreadPoolExecutor(max_workers=max_in_flight) if max_in_flight else None
+        self._lock = threading.Lock()
+        self._bytes_per_chunk = None
+        self.stats = {
+            "chunks": 0,
+            "reused": 0,
+            "moved": 0,
+            "deleted": 0,
+            "batches": 0,
+            "retries": 0,
+            "embed_seconds": 0.0,
+            "upsert_seconds": 0.0,
+            "bytes": 0,
+        }
+
+    def add(self, chunk):
+        id_ = self.id_for(chunk)
+        if id_ in self.existing:
+            self._keep(id_, chunk)
+            return
+        self._buffer.append(chunk)
+        if len(self._buffer) >= self.batch_size:
+            self._dispatch()
+
+    def _keep(self, id_, chunk):
+        metadata = chunk_metadata(chunk)
+        self._kept.add(id_)
+        self.stats["reused"] += 1
+        if metadata != self.existing[id_]:
+            self._moved.append((id_, metadata))
+        if self.lexical is not None:
+            self.lexical.add(id_, chunk["text"], metadata)
+
+    def _dispatch(self):
+        chunks, self._buffer = self._buffer, []
+        documents = [chunk["text"] for chunk in chunks]
+        metadatas = [chunk_metadata(chunk) for chunk in chunks]
+        ids = [self.id_for(chunk) for chunk in chunks]
+
+        started = time.perf_counter()
+        embeddings = self.embed(documents)
+        self.stats["embed_seconds"] += time.perf_counter() - started
+        if self.lexical is not None:
+            for id_, text, metadata in zip(ids, documents, metadatas):
+                self.lexical.add(id_, text, metadata)
+
+        payload = sum(len(text) + len(id_) for text, id_ in zip(documents, ids)) \
+            + embeddings.size * BYTES_PER_DIMENSION
+        self._resize(payload / len(chunks))
+        self.stats["chunks"] += len(chunks)
+        self.stats["bytes"] += payload
+
+        if self._pool is None:
+            self._upsert(ids, embeddings, documents, metadatas)
+            return
+        self._raise_failed()
+        self._slots.acquire()
+        future = self._pool.submit(self._upsert, ids, embeddings, documents, metadatas)
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def _resize(self, bytes_per_chunk):
+        # Smoothed, so one batch of unusually long chunks doesn't swing it
+        if self._bytes_per_chunk is None:
+            self._bytes_per_chunk = bytes_per_chunk
+        else:
+            self._bytes_per_chunk = 0.7 * self._bytes_per_chunk + 0.3 * bytes_per_chunk
+        with self._lock:
+            size = int(self.target_bytes / max(self._bytes_per_chunk, 1))
+            self.batch_size = max(MIN_BATCH, min(self.max_batch, size))
+
+    def _upsert(self, ids, embeddings, documents, metadatas, attempt=0):
+        started = time.perf_counter()
+        try:
+            self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        except Exception as e:
+            if attempt == self.max_retries:
+                raise
+            logging.warning(f"Upsert of {len(ids)} chunks failed, retrying: {str(e)}")
+            with self._lock:
+                self.stats["retries"] += 1
+                # May have been too big for the server; send smaller batches from now on
+                self.max_batch = max(MIN_BATCH, min(self.max_batch, len(ids) // 2))
+                self.batch_size = min(self.batch_size, self.max_batch)
+            time.sleep(BACKOFF * 2 ** attempt)
+            if len(ids) >= 2 * MIN_BATCH:
+                half = len(ids) // 2
+                self._upsert(ids[:half], embeddings[:half], documents[:half], metadatas[:half], attempt + 1)
+                self._upsert(ids[half:], embeddings[half:], documents[half:], metadatas[half:], attempt + 1)
+            else:
+                self._upsert(ids, embeddings, documents, metadatas, attempt + 1)
+            return
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["upsert_seconds"] += time.perf_counter() - started
+
+    def _raise_failed(self):
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                raise future.exception()
+
+    def _reconcile(self):
+        # Only once every new chunk is stored, so the collection never has a gap
+        for start in range(0, len(self._moved), self.max_batch):
+            batch = self._moved[start:start + self.max_batch]
+            self.collection.update(ids=[id_ for id_, _ in batch], metadatas=[metadata for _, metadata in batch])
+        self.stats["moved"] = len(self._moved)
+        removed = [id_ for id_ in self.existing if id_ not in self._kept]
+        for start in range(0, len(removed), self.max_batch):
+            self.collection.delete(ids=removed[start:start + self.max_batch])
+        self.stats["deleted"] = len(removed)
+
+    def flush(self):
+        """
+        Write anything buffered and wait for every upsert (re-raising the first
+        failure), then reconcile an incremental ingest. Returns the number of
+        chunks the collection now holds for this document.
+        """
+        try:
+            if self._buffer:
+                self._dispatch()
+            for future in self._futures:
+                future.result()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+        if self.existing:
+            self._reconcile()
+        return self.stats["chunks"] + self.stats["reused"]
@@ -0,0 +1,258 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_WORKERS = 2
+POLL_INTERVAL = 1.0
+# A running job whose heartbeat has stopped for this long belongs to a dead worker
+STALE_AFTER = 120
+HEARTBEAT_INTERVAL = 20
+# Runs a job gets before a PDF that keeps killing its worker is failed for good
+MAX_ATTEMPTS = 3
+# Don't write progress to SQLite more often than this
+PROGRESS_INTERVAL = 0.5
+
+
+class JobSuperseded(Exception):
+    """Raised by progress() once the job has been handed to a newer attempt."""
+
+
+class JobQueue:
+    """
+    Background ingestion jobs backed by a SQLite table, no broker required.
+
+    submit() stores the upload next to the database and queues a row. Every
+    process runs a dispatcher thread that claims queued rows atomically and
+    runs them on a small thread pool, so any gunicorn worker can pick up any
+    job. A running job has a heartbeat thread; jobs whose worker died (no
+    heartbeat for STALE_AFTER seconds) are queued again, up to max_attempts
+    runs in all, then marked failed. Every write an attempt makes is matched
+    on its attempt number, so an attempt that was given up on but is
+    somehow still running can't overwrite the retry's status or result,
+    and its next progress() raises JobSuperseded.
+
+    handler(job, progress) does the work and returns (result, status) like
+    save_to_chromadb; progress(stage, **counters) records how far it got.
+    Counters are job columns, e.g. collection_name, which a retry can use
+    to clean up after the attempt that died.
+    """
+
+    def __init__(self, db_path, upload_dir, handler, max_workers=MAX_WORKERS, max_attempts=MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.upload_dir = upload_dir
+        self.handler = handler
+        self.max_attempts = max_attempts
+        os.makedirs(upload_dir, exist_ok=True)
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._slots = threading.Semaphore(max_workers)
+        db = self._db()
+        db.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                document_id TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                pages_total INTEGER NOT NULL DEFAULT 0,
+                pages_processed INTEGER NOT NULL DEFAULT 0,
+                chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                collection_name TEXT,
+                error TEXT,
+                result TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+        columns = [row[1] for row in db.execute("PRAGMA table_info(jobs)")]
+        if "collection_name" not in columns:
+            db.execute("ALTER TABLE jobs ADD COLUMN collection_name TEXT")
+        db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, updated_at)")
+        db.commit()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="ingest-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _db(self):
+        # One connection per thread; SQLite connections can't be shared freely
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+        return db
+
+    def upload_path(self, job_id):
+        return os.path.join(self.upload_dir, f"{job_id}.pdf")
+
+    def submit(self, document_id, filename, file_bytes):
+        job_id = str(uuid.uuid4())
+        with open(self.upload_path(job_id), "wb") as f:
+            f.write(file_bytes)
+        now = time.time()
+        db = self._db()
+        db.execute(
+            "INSERT INTO jobs (id, document_id, filename, status, stage, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', 'queued', ?, ?)",
+            (job_id, document_id, filename, now, now),
+        )
+        db.commit()
+        return job_id
+
+    def get(self, job_id):
+        """Job status as a dict, with an ETA while it is running."""
+        row = self._db().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["eta_seconds"] = None
+        if job["status"] == "running" and job["pages_processed"] and job["pages_total"]:
+            rate = job["pages_processed"] / max(job["updated_at"] - job["started_at"], 1e-6)
+            job["eta_seconds"] = round((job["pages_total"] - job["pages_processed"]) / rate, 1)
+        return job
+
+    def _remove_upload(self, job_id):
+        try:
+            os.remove(self.upload_path(job_id))
+        except OSError:
+            pass
+
+    def _requeue_stale(self, db, now):
+        stale = db.execute(
+            "SELECT id, attempts FROM jobs WHERE status = 'running' AND updated_at < ?", (now - STALE_AFTER,)
+        ).fetchall()
+        for row in stale:
+            if row["attempts"] < self.max_attempts:
+                db.execute(
+                    "UPDATE jobs SET status = 'queued', stage = 'queued' WHERE id = ? AND status = 'running'",
+                    (row["id"],),
+                )
+                continue
+            error = f"Ingestion stopped responding {row['attempts']} times"
+            logging.error(f"Ingest job {row['id']} failed: {error}")
+            failed = db.execute(
+                "UPDATE jobs SET status = 'failed', stage = 'failed', error = ?, result = ?, updated_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (error, json.dumps({'error': error}), now, row["id"]),
+            ).rowcount
+            if failed:
+                self._remove_upload(row["id"])
+
+    def _claim(self):
+        db = self._db()
+        now = time.time()
+        self._requeue_stale(db, now)
+        row = db.execute(
+            "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+        ).fetchone()
+        if row is None:
+            db.commit()
+            return None
+        claimed = db.execute(
+            "UPDATE jobs SET status = 'running', stage = 'starting', attempts = attempts + 1, "
+            "started_at = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+            (now, now, row["id"]),
+        ).rowcount
+        db.commit()
+        return row["id"] if claimed else None
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            try:
+                job_id = self._claim()
+            except sqlite3.Error as e:
+                logging.error(f"Error claiming ingest job: {str(e)}")
+                job_id = None
+            if job_id is None:
+                self._slots.release()
+                time.sleep(POLL_INTERVAL)
+                continue
+            self._pool.submit(self._run, job_id)
+
+    def _heartbeat(self, job_id, attempt, stop, superseded):
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                db = self._db()
+                alive = db.execute(
+                    "UPDATE jobs SET updated_at = ? WHERE id = ? AND attempts = ? AND status = 'running'",
+                    (time.time(), job_id, attempt),
+                ).rowcount
+                db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error recording heartbeat of ingest job {job_id}: {str(e)}")
+                continue
+            if not alive:
+                superseded.set()
+                return
+
+    def _run(self, job_id):
+        stop = threading.Event()
+        try:
+            job = self.get(job_id)
+            attempt = job["attempts"]
+            superseded = threading.Event()
+            threading.Thread(
+                target=self._heartbeat, args=(job_id, attempt, stop, superseded),
+                name=f"ingest-heartbeat-{job_id[:8]}", daemon=True,
+            ).start()
+            last_write = 0
+
+            def progress(stage, **counters):
+                nonlocal last_write
+                if superseded.is_set():
+                    raise JobSuperseded(f"Ingest job {job_id} was retried after attempt {attempt}")
+                now = time.time()
+                if now - last_write < PROGRESS_INTERVAL and stage == job["stage"]:
+                    return
+                last_write = now
+                job["stage"] = stage
+                assignments = ", ".join(f"{column} = ?" for column in counters)
+                db = self._db()
+                updated = db.execute(
+                    f"UPDATE jobs SET stage = ?, updated_at = ?{', ' + assignments if assignments else ''} "
+                    "WHERE id = ? AND attempts = ?",
+                    (stage, now, *counters.values(), job_id, attempt),
+                ).rowcount
+                db.commit()
+                if not updated:
+                    superseded.set()
+                    raise JobSuperseded(f"Ingest job {job_id} was retried after attempt {attempt}")
+
+            try:
+                result, status = self.handler(job, progress)
+            except Exception as e:
+                logging.error(f"Ingest job {job_id} failed: {str(e)}")
+                result, status = {'error': str(e)}, 500
+
+            db = self._db()
+            finished = db.execute(
+                "UPDATE jobs SET status = ?, stage = ?, error = ?, result = ?, updated_at = ? "
+                "WHERE id = ? AND attempts = ?",
+                (
+                    "done" if status == 200 else "failed",
+                    "done" if status == 200 else "failed",
+                    result.get('error'),
+                    json.dumps(result),
+                    time.time(),
+                    job_id,
+                    attempt,
+                ),
+            ).rowcount
+            db.commit()
+            # A newer attempt owns the job (and still needs the upload)
+            if finished:
+                self._remove_upload(job_id)
+            else:
+                logging.warning(f"Discarding result of attempt {attempt} of ingest job {job_id}, it was retried")
+        finally:
+            stop.set()
+            self._slots.release()
@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+MAX_LOADED = 32
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class LexicalIndexBuilder:
+    """Collects chunks during ingest and writes a LexicalIndex."""
+
+    def __init__(self):
+        self.ids = []
+        self.lengths = []
+        self._docs = defaultdict(list)
+        self._tfs = defaultdict(list)
+        self._text = bytearray()
+        self._text_offsets = [0]
+        self._metadata = bytearray()
+        self._metadata_offsets = [0]
+
+    def add(self, chunk_id, text, metadata=None):
+        doc = len(self.ids)
+        counts = defaultdict(int)
+        for token in tokenize(text):
+            counts[token] += 1
+        for token, tf in counts.items():
+            self._docs[token].append(doc)
+            self._tfs[token].append(tf)
+        self.ids.append(chunk_id)
+        self.lengths.append(sum(counts.values()))
+        self._text += text.encode()
+        self._text_offsets.append(len(self._text))
+        self._metadata += json.dumps(metadata or {}).encode()
+        self._metadata_offsets.append(len(self._metadata))
+
+    def save(self, path):
+        """
+        Write postings as flat arrays: terms (sorted) and offsets locate each
+        term's slice of doc_ids/tfs, so loading is a few memory-mapped
+        np.load calls and nothing is parsed. Chunk text and metadata (JSON)
+        are byte blobs sliced by their own offsets, so a lexical-only hit
+        is read from here rather than fetched from the vector store.
+        """
+        os.makedirs(path, exist_ok=True)
+        terms = sorted(self._docs)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._docs[term]) for term in terms])
+        doc_ids = np.concatenate([np.asarray(self._docs[term], dtype=np.int32) for term in terms] or [np.zeros(0, np.int32)])
+        tfs = np.concatenate([np.asarray(self._tfs[term], dtype=np.int64) for term in terms] or [np.zeros(0, np.int64)])
+        np.save(os.path.join(path, "terms.npy"), np.asarray([term.encode() for term in terms], dtype=bytes))
+        np.save(os.path.join(path, "offsets.npy"), offsets)
+        np.save(os.path.join(path, "doc_ids.npy"), doc_ids)
+        np.save(os.path.join(path, "tfs.npy"), np.minimum(tfs, 65535).astype(np.uint16))
+        np.save(os.path.join(path, "ids.npy"), np.asarray([id_.encode() for id_ in self.ids], dtype=bytes))
+        np.save(os.path.join(path, "text.npy"), np.frombuffer(bytes(self._text), dtype=np.uint8))
+        np.save(os.path.join(path, "text_offsets.npy"), np.asarray(self._text_offsets, dtype=np.int64))
+        np.save(os.path.join(path, "metadata.npy"), np.frombuffer(bytes(self._metadata), dtype=np.uint8))
+        np.save(os.path.join(path, "metadata_offsets.npy"), np.asarray(self._metadata_offsets, dtype=np.int64))
+        # Written last: the store treats its mtime as the index's
+        np.save(os.path.join(path, "lengths.npy"), np.asarray(self.lengths, dtype=np.uint32))
+
+
+class LexicalIndex:
+    """BM25 over array-backed postings, memory-mapped from disk."""
+
+    def __init__(self, path):
+        self.terms = np.load(os.path.join(path, "terms.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+        self.doc_ids = np.load(os.path.join(path, "doc_ids.npy"), mmap_mode="r")
+        self.tfs = np.load(os.path.join(path, "tfs.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.text = np.load(os.path.join(path, "text.npy"), mmap_mode="r")
+        self.text_offsets = np.load(os.path.join(path, "text_offsets.npy"), mmap_mode="r")
+        self.metadata = np.load(os.path.join(path, "metadata.npy"), mmap_mode="r")
+        self.metadata_offsets = np.load(os.path.join(path, "metadata_offsets.npy"), mmap_mode="r")
+        self.lengths = np.load(os.path.join(path, "lengths.npy")).astype(np.float32)
+        self.average_length = float(self.lengths.mean()) if len(self.lengths) else 0.0
+        # Per-document BM25 length normalisation doesn't depend on the query
+        self._norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / max(self.average_length, 1e-6))
+
+    def chunk_id(self, position):
+        return self.ids[position].decode()
+
+    def row(self, position):
+        """(text, metadata) of the chunk at position."""
+        text = self.text[self.text_offsets[position]:self.text_offsets[position + 1]].tobytes().decode()
+        metadata = self.metadata[self.metadata_offsets[position]:self.metadata_offsets[position + 1]].tobytes()
+        return text, json.loads(metadata)
+
+    def _postings(self, term):
+        key = term.encode()
+        i = int(np.searchsorted(self.terms, key))
+        if i == len(self.terms) or self.terms[i] != key:
+            return None
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def search(self, query, n_results=10):
+        """Return [(position, score)] of the best-matching chunks."""
+        count = len(self.ids)
+        if not count:
+            return []
+        scores = np.zeros(count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            entry = self._postings(term)
+            if entry is None:
+                continue
+            start, end = entry
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            length = end - start
+            idf = np.log(1 + (count - length + 0.5) / (length + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self._norm[docs])
+
+        n_results = min(n_results, count)
+        top = np.argpartition(-scores, n_results - 1)[:n_results]
+        top = top[np.argsort(-scores[top])]
+        return [(int(p), float(scores[p])) for p in top if scores[p] > 0]
+
+
+class LexicalIndexStore:
+    """
+    One LexicalIndex directory per collection, with recently used ones kept
+    loaded (and reloaded once the index on disk is newer).
+    """
+
+    def __init__(self, path, max_loaded=MAX_LOADED):
+        self.path = path
+        self.max_loaded = max_loaded
+        os.makedirs(path, exist_ok=True)
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index_path(self, collection_name):
+        return os.path.join(self.path, collection_name)
+
+    def _mtime(self, collection_name):
+        try:
+            return os.stat(os.path.join(self._index_path(collection_name), "lengths.npy")).st_mtime_ns
+        except OSError:
+            return None
+
+    def save(self, collection_name, builder):
+        # Built beside the live index and swapped in, so no reader sees a
+        # half-written one (and workers with the old arrays mapped keep them)
+        path = self._index_path(collection_name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        builder.save(tmp_path)
+        old_path = f"{path}.{os.getpid()}.old"
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(tmp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        with self._lock:
+            self._loaded.pop(collection_name, None)
+
+    def get(self, collection_name):
+        mtime = self._mtime(collection_name)
+        if mtime is None:
+            return None
+        with self._lock:
+            entry = self._loaded.get(collection_name)
+            if entry is not None and entry[1] == mtime:
+                self._loaded.move_to_end(collection_name)
+                return entry[0]
+        try:
+            index = LexicalIndex(self._index_path(collection_name))
+        except (OSError, ValueError) as e:
+            logging.error(f"Error loading lexical index for {collection_name}: {str(e)}")
+            return None
+        with self._lock:
+            self._loaded[collection_name] = (index, mtime)
+            while len(self._loaded) > self.max_loaded:
+                self._loaded.popitem(last=False)
+        return index
+
+    def discard(self, collection_name):
+        with self._lock:
+            self._loaded.pop(collection_name, None)
+        shutil.rmtree(self._index_path(collection_name), ignore_errors=True)
+
+
+def reciprocal_rank_fusion(vector_results, index, lexical_hits, n_results, k=RRF_K):
+    """
+    Fuse a collection.query result with lexical hits from index by reciprocal
+    rank, returning a result in the same shape as collection.query. Text and
+    metadata of lexical-only hits come from the index, so fusing costs no
+    vector store round trip.
+    """
+    scores = defaultdict(float)
+    rows = {}
+    positions = {}
+    ids = vector_results["ids"][0]
+    documents = vector_results["documents"][0]
+    metadatas = (vector_results.get("metadatas") or [None])[0] or [{}] * len(ids)
+    for rank, (id_, text, meta) in enumerate(zip(ids, documents, metadatas)):
+        scores[id_] += 1 / (k + rank + 1)
+        rows[id_] = (text, meta)
+    for rank, (position, _) in enumerate(lexical_hits):
+        id_ = index.chunk_id(position)
+        scores[id_] += 1 / (k + rank + 1)
+        positions[id_] = position
+
+    best = sorted(scores, key=scores.get, reverse=True)[:n_results]
+    for id_ in best:
+        if id_ not in rows:
+            rows[id_] = index.row(positions[id_])
+    return {
+        "ids": [best],
+        "documents": [[rows[id_][0] for id_ in best]],
+        "metadatas": [[rows[id_][1] or {} for id_ in best]],
+    }
@@ -0,0 +1,319 @@
+import logging
+import os
+import random
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+TTL_SECONDS = 30 * 24 * 3600  # evict collections nobody has searched for this long
+QUOTA_BYTES = 0  # estimated storage across all collections; 0 means no quota
+SWEEP_INTERVAL = 600
+# Don't write a collection's last access to SQLite more often than this
+TOUCH_INTERVAL = 60
+# An unreferenced collection younger than this may still be mid-ingest
+ORPHAN_GRACE = 3600
+# float32 all-MiniLM-L6-v2 vectors
+VECTOR_BYTES = 384 * 4
+# Text per chunk assumed when sizing a collection we didn't ingest ourselves
+ESTIMATED_CHUNK_TEXT_BYTES = 1000
+
+# Set on every collection the app creates. main.py shares the database and
+# naming scheme but not the registry, so the name alone doesn't make a
+# collection ours to delete
+OWNER_METADATA = {"created_by": "eda-server"}
+
+# Collections named by generate_unique_collection_name: doc_<id>_<timestamp>_<uuid8>
+_COLLECTION_NAME_RE = re.compile(r'^doc_.+_(\d{9,})_[0-9a-f]{8}$')
+_UUID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def estimate_bytes(text_bytes, chunks):
+    """Storage a collection takes: its text plus one vector per chunk."""
+    return text_bytes + chunks * VECTOR_BYTES
+
+
+def _collection_name(collection):
+    # chromadb < 0.6 lists Collection objects, later versions just names
+    return getattr(collection, "name", collection)
+
+
+class CollectionLifecycle:
+    """
+    Creation time, last access and estimated size of every collection, in
+    SQLite, with a background sweeper that deletes collections.
+
+    Each sweep evicts collections not accessed for ttl seconds, then the
+    least recently accessed ones until the total is under quota_bytes, and
+    deletes orphans: collections this app created (tracked here, or
+    carrying OWNER_METADATA) that no document refers to, such as an ingest
+    that crashed, once they are older than ORPHAN_GRACE. Every worker runs a sweeper thread but a lease row in the
+    database lets only one of them sweep per interval.
+
+    With persist_path set it also deletes segment directories there that
+    Chroma's database no longer lists (all of them if the database is
+    gone), once they are older than ORPHAN_GRACE.
+
+    evict(collection_name) does the actual deleting (forgetting documents
+    and dropping the collection); referenced() returns {collection name:
+    registered at} for every collection that documents use.
+    """
+
+    def __init__(self, db_path, client, evict, referenced, ttl=TTL_SECONDS, quota_bytes=QUOTA_BYTES,
+                 sweep_interval=SWEEP_INTERVAL, persist_path=None):
+        self.client = client
+        self.evict = evict
+        self.referenced = referenced
+        self.ttl = ttl
+        self.quota_bytes = quota_bytes
+        self.sweep_interval = sweep_interval
+        # Chroma directory whose leftover segment directories get deleted
+        self.persist_path = persist_path
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Losing the last few access times in a power cut is fine
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS collections (
+                collection_name TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size_bytes INTEGER NOT NULL DEFAULT 0,
+                chunks INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS collections_last_access ON collections (last_access)")
+        # Running count and size, so stats don't scan the table
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS totals (id INTEGER PRIMARY KEY CHECK (id = 0), "
+            "collections INTEGER NOT NULL, size_bytes INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO totals SELECT 0, COUNT(*), COALESCE(SUM(size_bytes), 0) FROM collections"
+        )
+        self._db.executescript(
+            """CREATE TRIGGER IF NOT EXISTS collections_insert AFTER INSERT ON collections BEGIN
+                UPDATE totals SET collections = collections + 1, size_bytes = size_bytes + NEW.size_bytes;
+            END;
+            CREATE TRIGGER IF NOT EXISTS collections_delete AFTER DELETE ON collections BEGIN
+                UPDATE totals SET collections = collections - 1, size_bytes = size_bytes - OLD.size_bytes;
+            END;
+            CREATE TRIGGER IF NOT EXISTS collections_resize AFTER UPDATE OF size_bytes ON collections BEGIN
+                UPDATE totals SET size_bytes = size_bytes + NEW.size_bytes - OLD.size_bytes;
+            END;"""
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sweeper (id INTEGER PRIMARY KEY CHECK (id = 0), last_sweep REAL NOT NULL)"
+        )
+        self._db.execute("INSERT OR IGNORE INTO sweeper (id, last_sweep) VALUES (0, 0)")
+        self._db.commit()
+        self.stats = {
+            "sweeps": 0,
+            "evicted_ttl": 0,
+            "evicted_quota": 0,
+            "orphans_deleted": 0,
+            "segment_dirs_deleted": 0,
+            "last_sweep_ms": 0.0,
+        }
+        if sweep_interval:
+            self._sweeper = threading.Thread(target=self._run, name="collection-sweeper", daemon=True)
+            self._sweeper.start()
+
+    def record(self, collection_name, size_bytes=0, chunks=0):
+        """Note a collection that was just created or (re)filled, as accessed now."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO collections (collection_name, created_at, last_access, size_bytes, chunks) "
+                "VALUES (?, ?, ?, ?, ?) ON CONFLICT (collection_name) DO UPDATE SET "
+                "last_access = excluded.last_access, size_bytes = excluded.size_bytes, chunks = excluded.chunks",
+                (collection_name, now, now, size_bytes, chunks),
+            )
+            self._db.commit()
+            self._touched[collection_name] = now
+
+    def touch(self, collection_name):
+        """Mark a collection as used; cheap enough to call on every lookup."""
+        now = time.time()
+        if now - self._touched.get(collection_name, 0) < TOUCH_INTERVAL:
+            return
+        with self._lock:
+            self._touched[collection_name] = now
+            try:
+                self._db.execute(
+                    "UPDATE collections SET last_access = ? WHERE collection_name = ?", (now, collection_name)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Error recording access to {collection_name}: {str(e)}")
+
+    def forget(self, collection_name):
+        with self._lock:
+            self._db.execute("DELETE FROM collections WHERE collection_name = ?", (collection_name,))
+            self._db.commit()
+            self._touched.pop(collection_name, None)
+
+    def list(self, limit=50, offset=0):
+        """Collections, most recently accessed first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT collection_name, created_at, last_access, size_bytes, chunks FROM collections "
+                "ORDER BY last_access DESC LIMIT ? OFFSET ?",
+                (limit, offset),
+            ).fetchall()
+        return [
+            {"collection_name": name, "created_at": created_at, "last_access": last_access,
+             "size_bytes": size_bytes, "chunks": chunks}
+            for name, created_at, last_access, size_bytes, chunks in rows
+        ]
+
+    def _run(self):
+        while True:
+            # Jittered so workers started together don't all race for the lease
+            time.sleep(self.sweep_interval * random.uniform(0.5, 1.0))
+            try:
+                if self._claim_sweep():
+                    self.sweep()
+            except Exception as e:
+                logging.error(f"Error sweeping collections: {str(e)}")
+
+    def _claim_sweep(self):
+        now = time.time()
+        with self._lock:
+            claimed = self._db.execute(
+                "UPDATE sweeper SET last_sweep = ? WHERE id = 0 AND last_sweep <= ?",
+                (now, now - self.sweep_interval / 2),
+            ).rowcount
+            self._db.commit()
+        return claimed == 1
+
+    def _evict(self, collection_name, reason):
+        logging.info(f"Evicting collection {collection_name} ({reason})")
+        try:
+            self.evict(collection_name)
+        except Exception as e:
+            logging.error(f"Error evicting collection {collection_name}: {str(e)}")
+            return
+        self.forget(collection_name)
+        with self._lock:
+            self.stats[reason] += 1
+
+    def sweep(self):
+        """One pass: adopt untracked collections, then evict expired, over-quota and orphaned ones."""
+        started = time.perf_counter()
+        now = time.time()
+        referenced = self.referenced()
+        self._adopt(referenced)
+
+        with self._lock:
+            expired = [row[0] for row in self._db.execute(
+                "SELECT collection_name FROM collections WHERE last_access < ?", (now - self.ttl,)
+            )]
+        for collection_name in expired:
+            self._evict(collection_name, "evicted_ttl")
+
+        if self.quota_bytes:
+            with self._lock:
+                total = self._db.execute("SELECT size_bytes FROM totals").fetchone()[0]
+                rows = self._db.execute(
+                    "SELECT collection_name, size_bytes FROM collections ORDER BY last_access"
+                ).fetchall() if total > self.quota_bytes else []
+            for collection_name, size_bytes in rows:
+                if total <= self.quota_bytes:
+                    break
+                self._evict(collection_name, "evicted_quota")
+                total -= size_bytes
+
+        self._delete_orphans(referenced, now)
+        if self.persist_path:
+            self._delete_orphan_segments(now)
+        with self._lock:
+            self.stats["sweeps"] += 1
+            self.stats["last_sweep_ms"] = (time.perf_counter() - started) * 1000
+
+    def _adopt(self, referenced):
+        # Collections uploaded before they were tracked start their TTL now
+        with self._lock:
+            known = {row[0] for row in self._db.execute("SELECT collection_name FROM collections")}
+        for collection_name, registered_at in referenced.items():
+            if collection_name in known:
+                continue
+            try:
+                chunks = self.client.get_collection(name=collection_name).count()
+            except Exception as e:
+                logging.error(f"Error sizing collection {collection_name}: {str(e)}")
+                continue
+            now = time.time()
+            with self._lock:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO collections (collection_name, created_at, last_access, size_bytes, chunks) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (collection_name, registered_at, now,
+                     estimate_bytes(chunks * ESTIMATED_CHUNK_TEXT_BYTES, chunks), chunks),
+                )
+                self._db.commit()
+
+    def _delete_orphans(self, referenced, now):
+        with self._lock:
+            created = dict(self._db.execute("SELECT collection_name, created_at FROM collections"))
+        names = set(created)
+        try:
+            names.update(_collection_name(c) for c in self.client.list_collections())
+        except Exception as e:
+            logging.error(f"Error listing collections: {str(e)}")
+
+        for collection_name in names - set(referenced):
+            created_at = created.get(collection_name)
+            if created_at is None:
+                # Only touch collections this server created
+                match = _COLLECTION_NAME_RE.match(collection_name)
+                if not match or now - int(match.group(1)) < ORPHAN_GRACE or not self._owned(collection_name):
+                    continue
+                created_at = int(match.group(1))
+            if now - created_at < ORPHAN_GRACE:
+                continue
+            self._evict(collection_name, "orphans_deleted")
+
+    def _owned(self, collection_name):
+        try:
+            metadata = getattr(self.client.get_collection(name=collection_name), "metadata", None) or {}
+        except Exception as e:
+            logging.error(f"Error reading metadata of collection {collection_name}: {str(e)}")
+            return False
+        return all(metadata.get(key) == value for key, value in OWNER_METADATA.items())
+
+    def _delete_orphan_segments(self, now):
+        if not os.path.isdir(self.persist_path):
+            return
+        db_path = os.path.join(self.persist_path, "chroma.sqlite3")
+        # Without Chroma's database nothing can refer to a segment directory
+        segments = set()
+        if os.path.exists(db_path):
+            try:
+                chroma_db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+                try:
+                    segments = {row[0] for row in chroma_db.execute("SELECT id FROM segments")}
+                finally:
+                    chroma_db.close()
+            except sqlite3.Error as e:
+                logging.error(f"Error reading Chroma segments: {str(e)}")
+                return
+        for entry in os.listdir(self.persist_path):
+            path = os.path.join(self.persist_path, entry)
+            if not _UUID_RE.match(entry) or entry in segments or not os.path.isdir(path):
+                continue
+            if now - os.path.getmtime(path) < ORPHAN_GRACE:
+                continue
+            logging.info(f"Deleting orphaned Chroma segment directory {entry}")
+            shutil.rmtree(path, ignore_errors=True)
+            with self._lock:
+                self.stats["segment_dirs_deleted"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            count, size_bytes = self._db.execute("SELECT collections, size_bytes FROM totals").fetchone()
+            return dict(self.stats, collections=count, bytes=size_bytes,
+                        quota_bytes=self.quota_bytes, ttl=self.ttl)
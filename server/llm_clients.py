@@ -0,0 +1,423 @@
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+
+import httpx
+
+TIMEOUT = 60.0  # seconds, per request
+CONNECT_TIMEOUT = 5.0
+MAX_RETRIES = 2
+MAX_CONNECTIONS = 20
+BACKOFF = 0.5  # seconds; retry n sleeps up to BACKOFF * 2**n
+MAX_BACKOFF = 8.0
+
+SAMBANOVA_URL = "https://api.sambanova.ai/v1"
+OLLAMA_URL = "http://localhost:11434"
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram; percentiles are bucket upper bounds."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+
+    def record(self, ms):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+
+    def percentile(self, q):
+        if not self.count:
+            return 0.0
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= q * self.count:
+                return float(bound)
+        return float("inf")
+
+    def snapshot(self):
+        buckets = {f"<={bound}": count for bound, count in zip(BUCKETS_MS, self.counts)}
+        buckets[f">{BUCKETS_MS[-1]}"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": self.total_ms / self.count if self.count else 0.0,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "buckets": buckets,
+        }
+
+
+class ProviderStats:
+    """Request counters and connect/TTFB/total latency histograms for one provider."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.new_connections = 0
+        self.connect = LatencyHistogram()
+        self.ttfb = LatencyHistogram()
+        self.total = LatencyHistogram()
+
+    def record(self, connect_ms, ttfb_ms, total_ms):
+        with self._lock:
+            self.requests += 1
+            if connect_ms is not None:
+                self.new_connections += 1
+                self.connect.record(connect_ms)
+            self.ttfb.record(ttfb_ms)
+            self.total.record(total_ms)
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "retries": self.retries,
+                # Requests that had to open a connection rather than reuse one
+                "new_connections": self.new_connections,
+                "connect": self.connect.snapshot(),
+                "ttfb": self.ttfb.snapshot(),
+                "total": self.total.snapshot(),
+            }
+
+
+class _TimedStream(httpx.SyncByteStream):
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class _AsyncTimedStream(httpx.AsyncByteStream):
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for part in self._stream:
+            yield part
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+_CONNECT_EVENTS = (
+    "connection.connect_tcp.started",
+    "connection.connect_tcp.complete",
+    "connection.start_tls.complete",
+)
+
+
+def _on_close_recorder(stats, started, connect):
+    ttfb_ms = (time.perf_counter() - started) * 1000
+    connect_ms = (connect[-1] - connect[0]) * 1000 if len(connect) > 1 else None
+    return lambda: stats.record(connect_ms, ttfb_ms, (time.perf_counter() - started) * 1000)
+
+
+class _TimedTransport(httpx.HTTPTransport):
+    """
+    Pooled transport that times each request: connect (only when a new
+    connection is opened, TCP + TLS), time to response headers, and total
+    time until the body has been read or the stream closed.
+    """
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        connect = []
+
+        def trace(event, info):
+            if event in _CONNECT_EVENTS:
+                connect.append(time.perf_counter())
+
+        request.extensions["trace"] = trace
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            self.stats.record_error()
+            raise
+
+        response.stream = _TimedStream(response.stream, _on_close_recorder(self.stats, started, connect))
+        return response
+
+
+class _AsyncTimedTransport(httpx.AsyncHTTPTransport):
+    """_TimedTransport for the asyncio clients."""
+
+    def __init__(self, stats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    async def handle_async_request(self, request):
+        started = time.perf_counter()
+        connect = []
+
+        async def trace(event, info):
+            if event in _CONNECT_EVENTS:
+                connect.append(time.perf_counter())
+
+        request.extensions["trace"] = trace
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            self.stats.record_error()
+            raise
+
+        response.stream = _AsyncTimedStream(response.stream, _on_close_recorder(self.stats, started, connect))
+        return response
+
+
+def backoff_delay(attempt, base=BACKOFF, cap=MAX_BACKOFF):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class OllamaClient:
+    """Ollama's /api/generate over a pooled keep-alive connection, with retries."""
+
+    def __init__(self, http, stats, max_retries=MAX_RETRIES):
+        self.http = http
+        self.stats = stats
+        self.max_retries = max_retries
+
+    def _send(self, data, stream):
+        for attempt in range(self.max_retries + 1):
+            try:
+                request = self.http.build_request("POST", "/api/generate", json=data)
+                response = self.http.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Ollama request failed, retrying: {str(e)}")
+            else:
+                if response.status_code < 500 or attempt == self.max_retries:
+                    return response
+                response.close()
+            self.stats.record_retry()
+            time.sleep(backoff_delay(attempt))
+
+    def post(self, data):
+        """Send a non-streaming generate request and return the (read) response."""
+        return self._send(data, stream=False)
+
+    def stream(self, data):
+        """Yield the "response" text of each part of a streaming generate request."""
+        response = self._send({**data, "stream": True}, stream=True)
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                part = json.loads(line)
+                if part.get("response"):
+                    yield part["response"]
+                if part.get("done"):
+                    break
+        finally:
+            response.close()
+
+
+class AsyncOllamaClient(OllamaClient):
+    """OllamaClient over an httpx.AsyncClient, for the ASGI app."""
+
+    async def _send(self, data, stream):
+        for attempt in range(self.max_retries + 1):
+            try:
+                request = self.http.build_request("POST", "/api/generate", json=data)
+                response = await self.http.send(request, stream=stream)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                logging.warning(f"Ollama request failed, retrying: {str(e)}")
+            else:
+                if response.status_code < 500 or attempt == self.max_retries:
+                    return response
+                await response.aclose()
+            self.stats.record_retry()
+            await asyncio.sleep(backoff_delay(attempt))
+
+    async def post(self, data):
+        return await self._send(data, stream=False)
+
+    async def stream(self, data):
+        response = await self._send({**data, "stream": True}, stream=True)
+        try:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                part = json.loads(line)
+                if part.get("response"):
+                    yield part["response"]
+                if part.get("done"):
+                    break
+        finally:
+            await response.aclose()
+
+
+class LLMClients:
+    """
+    One pooled HTTP client per LLM provider, shared by every request in the
+    worker.
+
+    Clients are built on first use rather than at import, so workers forked
+    from a preloaded app each open their own connections. Groq and SambaNova
+    go through their SDKs, which retry with jittered exponential backoff up
+    to max_retries; Ollama retries the same way here.
+
+    groq_async, sambanova_async and ollama_async are the asyncio clients for
+    the ASGI app, so an LLM call there never holds a thread; each has its own
+    pool (bound to the event loop that first uses it) but shares its
+    provider's stats.
+    """
+
+    def __init__(self, groq_api_key=None, sambanova_api_key=None, ollama_url=OLLAMA_URL,
+                 timeout=TIMEOUT, connect_timeout=CONNECT_TIMEOUT,
+                 max_retries=MAX_RETRIES, max_connections=MAX_CONNECTIONS):
+        self.groq_api_key = groq_api_key
+        self.sambanova_api_key = sambanova_api_key
+        self.ollama_url = ollama_url
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60,
+        )
+        self.stats = {name: ProviderStats() for name in ("groq", "sambanova", "ollama")}
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def _http_client(self, provider, **kwargs):
+        return httpx.Client(
+            transport=_TimedTransport(self.stats[provider], limits=self.limits),
+            timeout=self.timeout,
+            **kwargs,
+        )
+
+    def _async_http_client(self, provider, **kwargs):
+        return httpx.AsyncClient(
+            transport=_AsyncTimedTransport(self.stats[provider], limits=self.limits),
+            timeout=self.timeout,
+            **kwargs,
+        )
+
+    def _client(self, provider, build):
+        client = self._clients.get(provider)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(provider)
+                if client is None:
+                    client = self._clients[provider] = build()
+        return client
+
+    @property
+    def groq(self):
+        def build():
+            from groq import Groq
+            return Groq(
+                api_key=self.groq_api_key,
+                http_client=self._http_client("groq"),
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+            )
+        return self._client("groq", build)
+
+    @property
+    def groq_async(self):
+        def build():
+            from groq import AsyncGroq
+            return AsyncGroq(
+                api_key=self.groq_api_key,
+                http_client=self._async_http_client("groq"),
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+            )
+        return self._client("groq_async", build)
+
+    @property
+    def sambanova(self):
+        def build():
+            import openai
+            return openai.OpenAI(
+                api_key=self.sambanova_api_key,
+                base_url=SAMBANOVA_URL,
+                http_client=self._http_client("sambanova"),
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+            )
+        return self._client("sambanova", build)
+
+    @property
+    def sambanova_async(self):
+        def build():
+            import openai
+            return openai.AsyncOpenAI(
+                api_key=self.sambanova_api_key,
+                base_url=SAMBANOVA_URL,
+                http_client=self._async_http_client("sambanova"),
+                timeout=self.timeout,
+                max_retries=self.max_retries,
+            )
+        return self._client("sambanova_async", build)
+
+    @property
+    def ollama(self):
+        def build():
+            return OllamaClient(
+                self._http_client("ollama", base_url=self.ollama_url),
+                self.stats["ollama"],
+                self.max_retries,
+            )
+        return self._client("ollama", build)
+
+    @property
+    def ollama_async(self):
+        def build():
+            return AsyncOllamaClient(
+                self._async_http_client("ollama", base_url=self.ollama_url),
+                self.stats["ollama"],
+                self.max_retries,
+            )
+        return self._client("ollama_async", build)
+
+    def snapshot(self):
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
@@ -0,0 +1,412 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+WINDOW = 100  # latencies / outcomes kept per provider
+MIN_SAMPLES = 20  # before a provider's own p95 is trusted as its hedge delay
+DEFAULT_LATENCY = 2.0  # seconds, assumed for providers with no history
+MIN_HEDGE_DELAY = 0.05
+FAILURE_THRESHOLD = 5  # consecutive failures that open the circuit
+COOLDOWN = 30.0  # seconds an open circuit stays open before a trial request
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class LLMUnavailable(Exception):
+    """Every provider failed or is circuit-broken."""
+
+
+class Provider:
+    """
+    An LLM backend the router can call with a finished prompt.
+
+    complete(prompt) returns the answer and stream(prompt) yields it token by
+    token. acomplete/astream are optional asyncio versions; without them the
+    router runs the sync ones in a thread. model names what it runs, so the
+    prompt can be sized for it.
+    """
+
+    def __init__(self, name, complete, stream, acomplete=None, astream=None, model=None):
+        self.name = name
+        self.model = model
+        self.complete = complete
+        self.stream = stream
+        self.acomplete = acomplete
+        self.astream = astream
+
+
+class MockProvider(Provider):
+    """
+    Offline stand-in with configurable latency, errors and stalls, for
+    exercising the router without network access (see bench_llm_router.py
+    or LLM_PROVIDERS=mock).
+    """
+
+    def __init__(self, name="mock", latency=0.3, jitter=0.1, error_rate=0.0,
+                 stall_rate=0.0, stall=5.0, tokens=8, token_delay=0.01):
+        super().__init__(name, self._complete, self._stream, self._acomplete, self._astream)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.tokens = tokens
+        self.token_delay = token_delay
+
+    def _delay(self):
+        if random.random() < self.stall_rate:
+            return self.stall
+        return max(0.0, random.gauss(self.latency, self.jitter))
+
+    def _answer(self, prompt):
+        if random.random() < self.error_rate:
+            raise RuntimeError(f"{self.name}: simulated failure")
+        return [f"{self.name}-token{i} " for i in range(self.tokens)]
+
+    def _complete(self, prompt):
+        # A full answer takes as long as streaming every token would
+        time.sleep(self._delay() + self.tokens * self.token_delay)
+        return "".join(self._answer(prompt))
+
+    def _stream(self, prompt):
+        time.sleep(self._delay())
+        for token in self._answer(prompt):
+            yield token
+            time.sleep(self.token_delay)
+
+    async def _acomplete(self, prompt):
+        await asyncio.sleep(self._delay() + self.tokens * self.token_delay)
+        return "".join(self._answer(prompt))
+
+    async def _astream(self, prompt):
+        await asyncio.sleep(self._delay())
+        for token in self._answer(prompt):
+            yield token
+            await asyncio.sleep(self.token_delay)
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _ProviderState:
+    """Rolling latency/outcome windows and circuit breaker for one provider."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        # Latency to the full answer (complete) or to the first token (stream)
+        self.latencies = {"complete": deque(maxlen=WINDOW), "stream": deque(maxlen=WINDOW)}
+        self.outcomes = deque(maxlen=WINDOW)
+        self.consecutive_failures = 0
+        self.circuit = CLOSED
+        self.opened_at = 0.0
+        self.trial_running = False
+        self.stats = {"requests": 0, "failures": 0, "hedges": 0, "wins": 0, "cancelled": 0, "circuit_opens": 0}
+
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def expected_latency(self, mode):
+        latencies = self.latencies[mode]
+        return _percentile(latencies, 0.5) if latencies else DEFAULT_LATENCY
+
+    def hedge_delay(self, mode):
+        """This provider's p95 latency, or None (don't hedge) until it has MIN_SAMPLES of history."""
+        latencies = self.latencies[mode]
+        if len(latencies) < MIN_SAMPLES:
+            return None
+        return max(MIN_HEDGE_DELAY, _percentile(latencies, 0.95))
+
+    def available(self, now):
+        if self.circuit == OPEN and now - self.opened_at >= COOLDOWN:
+            self.circuit = HALF_OPEN
+        if self.circuit == HALF_OPEN:
+            return not self.trial_running
+        return self.circuit == CLOSED
+
+
+class LLMRouter:
+    """
+    Route each prompt to the provider expected to answer fastest.
+
+    Providers are ranked by median latency, penalised by recent error rate.
+    With hedge on, if the chosen provider hasn't produced its first token
+    within its own p95 latency (once it has MIN_SAMPLES calls to take that
+    from), the next provider is tried as well; the first to answer wins
+    and the other's stream is closed. complete() hedges by streaming too,
+    since a blocking call that loses can't be stopped. A provider that
+    fails FAILURE_THRESHOLD times in a row is skipped for COOLDOWN seconds,
+    then let through for one trial request. Failures fail over to the next
+    provider immediately.
+    """
+
+    def __init__(self, providers, hedge=False, max_workers=32):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self._states = [_ProviderState(provider) for provider in providers]
+        self.hedge = hedge
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+        self.stats = {"requests": 0, "hedged": 0, "failovers": 0, "unavailable": 0}
+
+    @property
+    def models(self):
+        """Models of every provider a prompt may be sent to (by failover or hedging)."""
+        return [state.provider.model for state in self._states]
+
+    def _candidates(self, mode):
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            states = [state for state in self._states if state.available(now)]
+            states.sort(key=lambda state: state.expected_latency(mode) * (1 + 4 * state.error_rate()))
+            if not states:
+                self.stats["unavailable"] += 1
+                raise LLMUnavailable("All LLM providers are circuit-broken")
+            return states
+
+    def _started(self, state, hedged):
+        with self._lock:
+            state.stats["requests"] += 1
+            if hedged:
+                state.stats["hedges"] += 1
+                self.stats["hedged"] += 1
+            if state.circuit == HALF_OPEN:
+                state.trial_running = True
+
+    def _record(self, state, mode, elapsed, ok):
+        with self._lock:
+            state.trial_running = False
+            state.outcomes.append(ok)
+            if ok:
+                state.latencies[mode].append(elapsed)
+                state.consecutive_failures = 0
+                state.circuit = CLOSED
+                return
+            state.stats["failures"] += 1
+            state.consecutive_failures += 1
+            if state.circuit == HALF_OPEN or state.consecutive_failures >= FAILURE_THRESHOLD:
+                if state.circuit != OPEN:
+                    state.stats["circuit_opens"] += 1
+                    logging.warning(f"Circuit opened for LLM provider {state.provider.name}")
+                state.circuit = OPEN
+                state.opened_at = time.monotonic()
+
+    def _won(self, state, losers):
+        with self._lock:
+            state.stats["wins"] += 1
+            for loser in losers:
+                loser.stats["cancelled"] += 1
+
+    def _hedge_at(self, state, mode):
+        delay = state.hedge_delay(mode) if self.hedge else None
+        return None if delay is None else time.monotonic() + delay
+
+    # -- sync --
+
+    def _attempt(self, state, mode, prompt):
+        started = time.perf_counter()
+        try:
+            if mode == "complete":
+                result = state.provider.complete(prompt)
+            else:
+                tokens = state.provider.stream(prompt)
+                result = (tokens, next(tokens, None))
+        except Exception:
+            self._record(state, mode, time.perf_counter() - started, False)
+            raise
+        self._record(state, mode, time.perf_counter() - started, True)
+        return result
+
+    def _race(self, mode, prompt):
+        candidates = self._candidates(mode)
+        pending = {}
+        errors = []
+        launched = 0
+
+        def launch(hedged=False):
+            nonlocal launched
+            state = candidates[launched]
+            launched += 1
+            self._started(state, hedged)
+            pending[self._pool.submit(self._attempt, state, mode, prompt)] = state
+
+        launch()
+        hedge_at = self._hedge_at(candidates[0], mode)
+        while pending:
+            timeout = None
+            if hedge_at is not None and launched < len(candidates):
+                timeout = max(0.0, hedge_at - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                launch(hedged=True)
+                hedge_at = None
+                continue
+            for future in done:
+                state = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"LLM provider {state.provider.name} failed: {str(e)}")
+                    errors.append(f"{state.provider.name}: {str(e)}")
+                    continue
+                self._cancel(pending, mode)
+                self._won(state, pending.values())
+                return result
+            if not pending and launched < len(candidates):
+                with self._lock:
+                    self.stats["failovers"] += 1
+                launch()
+        raise LLMUnavailable("; ".join(errors))
+
+    def _cancel(self, pending, mode):
+        for future in pending:
+            if not future.cancel() and mode == "stream":
+                # Already running: close its stream as soon as it has one
+                future.add_done_callback(_close_stream)
+
+    def complete(self, prompt):
+        """Return the answer to prompt from whichever provider answers first."""
+        if self.hedge and len(self._states) > 1:
+            # Streamed, so the losing request can be closed instead of running to the end
+            return "".join(self.stream(prompt))
+        return self._race("complete", prompt)
+
+    def stream(self, prompt):
+        """Yield the answer to prompt token by token, hedging on the first token."""
+        tokens, first = self._race("stream", prompt)
+        if first is None:
+            return
+        yield first
+        yield from tokens
+
+    # -- asyncio --
+
+    async def _aattempt(self, state, mode, prompt):
+        started = time.perf_counter()
+        tokens = None
+        try:
+            if mode == "complete":
+                if state.provider.acomplete is not None:
+                    result = await state.provider.acomplete(prompt)
+                else:
+                    result = await asyncio.to_thread(state.provider.complete, prompt)
+            else:
+                if state.provider.astream is not None:
+                    tokens = state.provider.astream(prompt)
+                else:
+                    tokens = _threaded_stream(state.provider.stream(prompt))
+                result = (tokens, await tokens.__anext__())
+        except StopAsyncIteration:
+            result = (tokens, None)
+        except asyncio.CancelledError:
+            with self._lock:
+                state.trial_running = False
+            if tokens is not None:
+                await tokens.aclose()
+            raise
+        except Exception:
+            self._record(state, mode, time.perf_counter() - started, False)
+            raise
+        self._record(state, mode, time.perf_counter() - started, True)
+        return result
+
+    async def _arace(self, mode, prompt):
+        candidates = self._candidates(mode)
+        pending = {}
+        errors = []
+        launched = 0
+
+        def launch(hedged=False):
+            nonlocal launched
+            state = candidates[launched]
+            launched += 1
+            self._started(state, hedged)
+            pending[asyncio.ensure_future(self._aattempt(state, mode, prompt))] = state
+
+        launch()
+        hedge_at = self._hedge_at(candidates[0], mode)
+        try:
+            while pending:
+                timeout = None
+                if hedge_at is not None and launched < len(candidates):
+                    timeout = max(0.0, hedge_at - time.monotonic())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    launch(hedged=True)
+                    hedge_at = None
+                    continue
+                for task in done:
+                    state = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logging.error(f"LLM provider {state.provider.name} failed: {str(e)}")
+                        errors.append(f"{state.provider.name}: {str(e)}")
+                        continue
+                    self._won(state, pending.values())
+                    return result
+                if not pending and launched < len(candidates):
+                    with self._lock:
+                        self.stats["failovers"] += 1
+                    launch()
+            raise LLMUnavailable("; ".join(errors))
+        finally:
+            for task in pending:
+                if not task.done():
+                    task.cancel()
+                elif mode == "stream" and not task.cancelled() and task.exception() is None:
+                    await task.result()[0].aclose()
+
+    async def acomplete(self, prompt):
+        return await self._arace("complete", prompt)
+
+    async def astream(self, prompt):
+        tokens, first = await self._arace("stream", prompt)
+        if first is None:
+            return
+        try:
+            yield first
+            async for token in tokens:
+                yield token
+        finally:
+            await tokens.aclose()
+
+    def snapshot(self):
+        with self._lock:
+            providers = {}
+            for state in self._states:
+                providers[state.provider.name] = {
+                    **state.stats,
+                    "circuit": state.circuit,
+                    "error_rate": state.error_rate(),
+                    "p50_ms": {mode: _percentile(values, 0.5) * 1000 if values else None
+                               for mode, values in state.latencies.items()},
+                    "p95_ms": {mode: _percentile(values, 0.95) * 1000 if values else None
+                               for mode, values in state.latencies.items()},
+                }
+            return {**self.stats, "hedge": self.hedge, "providers": providers}
+
+
+def _close_stream(future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    tokens, _ = future.result()
+    tokens.close()
+
+
+async def _threaded_stream(tokens):
+    """Drive a blocking token generator from a worker thread."""
+    try:
+        while True:
+            token = await asyncio.to_thread(next, tokens, None)
+            if token is None:
+                return
+            yield token
+    finally:
+        await asyncio.to_thread(tokens.close)
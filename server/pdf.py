@@ -1,10 +1,9 @@
 from flask import Flask, request, jsonify
 import logging
-import fitz  # PyMuPDF
 from io import BytesIO
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.text_splitter import NLTKTextSplitter
-from utils import full_text_cleanup
+from chunker import split_on_separator, split_sentence_chunks
+from utils import fast_text_cleanup
+from extraction import extract_document_text
 from flask_cors import CORS
 
 app = Flask(__name__)
@@ -15,13 +14,11 @@ logging.basicConfig(level=logging.INFO)
 
 def lang_clean_text(text):
     # text = text.replace("\n", " ").strip()  
-    text = full_text_cleanup(text)
-    text_splitter = CharacterTextSplitter(chunk_size=100, chunk_overlap=20)
-    return text_splitter.split_text(text)
+    text = fast_text_cleanup(text)
+    return split_on_separator(text, chunk_size=100, chunk_overlap=20)
 
 def split_text_into_sentences(text):
-    text_splitter = NLTKTextSplitter()
-    sentences = text_splitter.split_text(text)
+    sentences = split_sentence_chunks(text)
     cleaned_sentences = [sentence.replace("\n", " ") for sentence in sentences]
     return cleaned_sentences
 
@@ -29,11 +26,7 @@ def create_resources_from_bytes(pdf_stream):
     """Modified version of create_resources to work with BytesIO instead of file path"""
     
     try:
-        doc = fitz.open(stream=pdf_stream)
-        text = ""
-        for page in doc:
-            text += page.get_text()
-        doc.close()
+        text = extract_document_text(pdf_stream)
         
         if not text.strip():
             logging.error("No text extracted from PDF")
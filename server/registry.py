@@ -0,0 +1,222 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MAX_HANDLES = 128
+
+
+class CollectionRegistry:
+    """
+    Maps a client-supplied document ID to its Chroma collection.
+
+    The document -> collection name mapping lives in SQLite so every gunicorn
+    worker sees the same uploads. Resolved Collection handles are cached
+    in-process with LRU eviction so /search doesn't pay a get_collection
+    round-trip per question; a cached handle is only used while the
+    document's row still names its collection.
+
+    Collections are also indexed by a hash of the uploaded bytes, so identical
+    uploads share one collection. Each content entry counts the documents
+    that use it; release() reports when the last one is gone.
+    """
+
+    def __init__(self, client, db_path, max_handles=MAX_HANDLES):
+        self.client = client
+        self.max_handles = max_handles
+        self._handles = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS documents (
+                document_id TEXT PRIMARY KEY,
+                collection_name TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                content_hash TEXT
+            )"""
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(documents)")]
+        if "content_hash" not in columns:
+            self._db.execute("ALTER TABLE documents ADD COLUMN content_hash TEXT")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS contents (
+                content_hash TEXT PRIMARY KEY,
+                collection_name TEXT NOT NULL UNIQUE,
+                refcount INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_collection ON documents (collection_name)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS documents_created ON documents (created_at)")
+        self._db.commit()
+
+    def _cache(self, document_id, collection):
+        self._handles[document_id] = collection
+        self._handles.move_to_end(document_id)
+        while len(self._handles) > self.max_handles:
+            self._handles.popitem(last=False)
+
+    def _unreference(self, document_id):
+        """Drop document_id's reference to its content. Returns the collection name if now unused."""
+        row = self._db.execute(
+            "SELECT collection_name, content_hash FROM documents WHERE document_id = ?", (document_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        collection_name, content_hash = row
+        if content_hash is None:
+            return collection_name
+
+        self._db.execute(
+            "UPDATE contents SET refcount = refcount - 1 WHERE content_hash = ?", (content_hash,)
+        )
+        remaining = self._db.execute(
+            "SELECT refcount FROM contents WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        if remaining is None or remaining[0] > 0:
+            return None
+        self._db.execute("DELETE FROM contents WHERE content_hash = ?", (content_hash,))
+        return collection_name
+
+    def register(self, document_id, collection, content_hash=None):
+        """
+        Record that document_id is stored in collection (holding content_hash).
+        If document_id was registered before and its old collection is now
+        unused, that collection's name is returned so the caller can delete it.
+        """
+        with self._lock:
+            if content_hash is not None:
+                self._db.execute(
+                    "UPDATE contents SET refcount = refcount + 1 WHERE content_hash = ?", (content_hash,)
+                )
+            previous = self._unreference(document_id)
+            self._db.execute(
+                "INSERT OR REPLACE INTO documents (document_id, collection_name, created_at, content_hash) "
+                "VALUES (?, ?, ?, ?)",
+                (document_id, collection.name, time.time(), content_hash),
+            )
+            self._db.commit()
+            self._cache(document_id, collection)
+        return previous if previous != collection.name else None
+
+    def find_content(self, content_hash):
+        """Name of the collection already holding content_hash, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT collection_name FROM contents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def claim_content(self, content_hash, collection_name):
+        """
+        Make collection_name the shared collection for content_hash unless
+        another upload got there first. Returns the collection to use.
+        """
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO contents (content_hash, collection_name, refcount) VALUES (?, ?, 0)",
+                (content_hash, collection_name),
+            )
+            self._db.commit()
+            row = self._db.execute(
+                "SELECT collection_name FROM contents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return row[0]
+
+    def take_for_update(self, document_id):
+        """
+        Prepare document_id's collection to be changed in place by a re-upload.
+        If no other document shares it, its content hash is forgotten (so new
+        uploads can't deduplicate onto it while it is half updated) and its
+        name is returned; otherwise None. register() records the new hash.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT collection_name FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            users = self._db.execute(
+                "SELECT COUNT(*) FROM documents WHERE collection_name = ?", (row[0],)
+            ).fetchone()[0]
+            if users > 1:
+                return None
+            self._db.execute("DELETE FROM contents WHERE collection_name = ?", (row[0],))
+            self._db.execute("UPDATE documents SET content_hash = NULL WHERE document_id = ?", (document_id,))
+            self._db.commit()
+        return row[0]
+
+    def collection_name(self, document_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT collection_name FROM documents WHERE document_id = ?", (document_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get(self, document_id):
+        """Return the Collection for document_id, or None if it isn't known."""
+        # Checked against SQLite on every lookup: another worker may have
+        # deleted the document or moved it to a different collection
+        name = self.collection_name(document_id)
+        with self._lock:
+            collection = self._handles.get(document_id)
+            if collection is not None:
+                if name == collection.name:
+                    self._handles.move_to_end(document_id)
+                    return collection
+                del self._handles[document_id]
+        if name is None:
+            return None
+
+        try:
+            collection = self.client.get_collection(name=name)
+        except Exception as e:
+            logging.error(f"Error getting collection {name}: {str(e)}")
+            return None
+
+        with self._lock:
+            self._cache(document_id, collection)
+        return collection
+
+    def in_use(self, collection_name):
+        """Whether any document is stored in collection_name."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM documents WHERE collection_name = ? LIMIT 1", (collection_name,)
+            ).fetchone()
+        return row is not None
+
+    def collections(self):
+        """{collection name: when it was first registered} for every collection a document uses."""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT collection_name, MIN(created_at) FROM documents GROUP BY collection_name"
+            ))
+
+    def forget_collection(self, collection_name):
+        """Forget every document stored in collection_name, e.g. before it is evicted."""
+        with self._lock:
+            self._db.execute("DELETE FROM documents WHERE collection_name = ?", (collection_name,))
+            self._db.execute("DELETE FROM contents WHERE collection_name = ?", (collection_name,))
+            self._db.commit()
+            for document_id, collection in list(self._handles.items()):
+                if collection.name == collection_name:
+                    del self._handles[document_id]
+
+    def release(self, document_id):
+        """
+        Forget document_id. Returns the name of its collection if no other
+        document uses it any more (the caller should delete it), else None.
+        """
+        with self._lock:
+            unused = self._unreference(document_id)
+            self._db.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            self._db.commit()
+            self._handles.pop(document_id, None)
+            if unused:
+                # Other documents may still hold a handle to a collection we're deleting
+                for other, collection in list(self._handles.items()):
+                    if collection.name == unused:
+                        del self._handles[other]
+        return unused
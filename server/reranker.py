@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from chunker import estimate_tokens
+
+MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+BATCH_SIZE = 16
+BUDGET = 0.25  # seconds
+
+
+def _top(results, order, k):
+    order = order[:k]
+    return {
+        key: [[results[key][0][i] for i in order]]
+        for key in ("ids", "documents", "metadatas")
+        if results.get(key)
+    }
+
+
+class Reranker:
+    """
+    Rescore retrieved chunks with a small CPU cross-encoder and keep the best k.
+
+    Scoring runs in batches on a background thread; if it hasn't finished
+    within budget seconds the request goes ahead with the original ordering
+    and the scoring thread stops at its next batch. Until the model has
+    loaded (in the background, on first use) results pass through unchanged.
+
+    Needs the optional sentence-transformers package; without it rerank()
+    is a pass-through and available turns False after the first attempt
+    to load the model.
+    """
+
+    def __init__(self, model_name=MODEL_NAME, budget=BUDGET, batch_size=BATCH_SIZE):
+        self.model_name = model_name
+        self.budget = budget
+        self.batch_size = batch_size
+        self._model = None
+        self._loading = False
+        self._unavailable = False
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rerank")
+        self.stats = {
+            "requests": 0,
+            "reranked": 0,
+            "timeouts": 0,
+            "passthrough": 0,
+            "total_ms": 0.0,
+            "max_ms": 0.0,
+            "tokens_before": 0,
+            "tokens_after": 0,
+        }
+
+    def _load(self):
+        try:
+            from sentence_transformers import CrossEncoder
+            self._model = CrossEncoder(self.model_name, device="cpu")
+            logging.info(f"Loaded reranker {self.model_name}")
+        except Exception as e:
+            logging.error(f"Reranker disabled, could not load {self.model_name}: {str(e)}")
+            self._unavailable = True
+
+    @property
+    def available(self):
+        """False once the model failed to load, so callers can stop over-fetching for it."""
+        return not self._unavailable
+
+    def _ready(self):
+        if self._model is not None:
+            return True
+        with self._lock:
+            if not self._loading and not self._unavailable:
+                self._loading = True
+                self._pool.submit(self._load)
+        return False
+
+    def _score(self, query, documents, cancelled):
+        scores = []
+        for start in range(0, len(documents), self.batch_size):
+            if cancelled.is_set():
+                return None
+            pairs = [(query, text) for text in documents[start:start + self.batch_size]]
+            scores.extend(float(score) for score in self._model.predict(pairs))
+        return scores
+
+    def rerank(self, query, results, k):
+        """Return results (collection.query shape) cut down to the k best chunks."""
+        documents = results["documents"][0]
+        original = list(range(len(documents)))
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["tokens_before"] += sum(estimate_tokens(text) for text in documents[:k])
+
+        if len(documents) <= 1 or not self._ready():
+            return self._finish(results, original, k, "passthrough", 0.0)
+
+        started = time.perf_counter()
+        cancelled = threading.Event()
+        future = self._pool.submit(self._score, query, documents, cancelled)
+        try:
+            scores = future.result(timeout=self.budget)
+        except TimeoutError:
+            cancelled.set()
+            return self._finish(results, original, k, "timeouts", time.perf_counter() - started)
+        except Exception as e:
+            logging.error(f"Reranking failed: {str(e)}")
+            return self._finish(results, original, k, "passthrough", time.perf_counter() - started)
+
+        order = sorted(original, key=lambda i: scores[i], reverse=True)
+        return self._finish(results, order, k, "reranked", time.perf_counter() - started)
+
+    def _finish(self, results, order, k, outcome, elapsed):
+        top = _top(results, order, k)
+        elapsed_ms = elapsed * 1000
+        with self._lock:
+            self.stats[outcome] += 1
+            self.stats["total_ms"] += elapsed_ms
+            self.stats["max_ms"] = max(self.stats["max_ms"], elapsed_ms)
+            self.stats["tokens_after"] += sum(estimate_tokens(text) for text in top["documents"][0])
+        return top
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        scored = stats["reranked"] + stats["timeouts"]
+        stats["mean_ms"] = stats["total_ms"] / scored if scored else 0.0
+        stats["loaded"] = self._model is not None
+        return stats
@@ -1,4 +1,6 @@
+import codecs
 import re
+import string
 import unicodedata
 
 def clean_text_(text):
@@ -38,3 +40,103 @@ def full_text_cleanup(text):
     
     return text
 
+
+
+# Precompiled pipeline. Produces the same output as full_text_cleanup,
+# except header/footer lines are dropped per line *before* newlines are collapsed
+# (full_text_cleanup only ever sees one line, so it either drops the whole
+# document or nothing). normalize_unicode is skipped: after the character
+# whitelist only ASCII is left, so NFKD is a no-op.
+_HEADER_FOOTER_RE = re.compile(r'(Page \d+|Confidential|Company Name)')
+# "word- word" joined as full_text_cleanup's (\w+)-\s+(\w+) does, but searched
+# from the hyphen: the leading \w+ made the regex retry at every letter
+_HYPHENATION_RE = re.compile(r'-\s+(\w+)')
+
+
+def _drop_non_ascii(error):
+    # Everything outside ASCII is off the whitelist; a run that contains
+    # whitespace still separates the words around it
+    run = error.object[error.start:error.end]
+    return (" " if any(char.isspace() for char in run) else ""), error.end
+
+
+codecs.register_error("text_cleanup", _drop_non_ascii)
+# The character whitelist and lowercasing as one bytes.translate: whitespace
+# becomes a space, A-Z become a-z, anything else off the whitelist is deleted
+_KEEP = (string.ascii_letters + string.digits + ".,!?'\"").encode()
+_TRANSLATE = bytes(
+    32 if chr(byte).isspace() else ord(chr(byte).lower()) if byte < 128 else byte for byte in range(256)
+)
+_DELETE = bytes(byte for byte in range(256) if byte not in _KEEP and not chr(byte).isspace())
+# Tail of a page that may continue on the next one: a hyphenated "word-" or a
+# token cut off without trailing whitespace. Only tried at token starts, the
+# same leftmost match without a full attempt at every character
+_PAGE_TAIL_RE = re.compile(r'(?<!\S)(?:\S*\w-\s+)*\S*\Z')
+_WHITESPACE_RE = re.compile(r'\s')
+_PAGE_TAIL_WINDOW = 256
+
+
+def _strip_headers_footers(text):
+    if not _HEADER_FOOTER_RE.search(text):
+        return text
+    return "\n".join(line for line in text.split("\n") if not _HEADER_FOOTER_RE.match(line))
+
+
+def _join_hyphenated(text):
+    last_end = -1
+
+    def join(match):
+        nonlocal last_end
+        start = match.start()
+        before = text[start - 1] if start else ""
+        # Needs a word before the hyphen that the previous join didn't take
+        if start == last_end or not (before.isalnum() or before == "_"):
+            return match.group()
+        last_end = match.end()
+        return match.group(1)
+
+    return _HYPHENATION_RE.sub(join, text)
+
+
+def _clean(text):
+    text = _join_hyphenated(text)
+    data = text.encode("ascii", "text_cleanup").translate(_TRANSLATE, _DELETE)
+    return b" ".join(data.split()).decode("ascii")
+
+
+def fast_text_cleanup(text):
+    """
+    Same cleanup as full_text_cleanup in three passes: hyphenation, then
+    the character whitelist and lowercasing as one translate over the
+    bytes, then collapsing whitespace.
+    """
+    return _clean(_strip_headers_footers(str(text)))
+
+
+def iter_cleaned_pages(pages):
+    """
+    Clean pages (dicts with "page_number" and "text") one at a time.
+
+    A word split across two pages is carried over and cleaned with the next
+    page, so joining the non-empty outputs with spaces matches cleaning the
+    concatenated document at once.
+    """
+    carry = ""
+    last = None
+    for page in pages:
+        last = page
+        text = carry + _strip_headers_footers(page["text"])
+        carry = ""
+        # Only look at the last few words, starting on a word boundary
+        start = 0
+        if len(text) > _PAGE_TAIL_WINDOW:
+            boundary = _WHITESPACE_RE.search(text, len(text) - _PAGE_TAIL_WINDOW)
+            start = boundary.start() if boundary else 0
+        match = _PAGE_TAIL_RE.search(text, start)
+        if match:
+            carry = text[match.start():]
+            text = text[:match.start()]
+        yield dict(page, text=_clean(text))
+    if carry:
+        # The trailing fragment ends the last page
+        yield dict(last, text=_clean(carry))
@@ -0,0 +1,414 @@
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+# Collections with at least this many vectors use an HNSW index when hnswlib
+# is installed; below it an exact matrix product is faster than the graph
+HNSW_MIN_VECTORS = 20000
+
+
+def create_vector_store(backend, lazy=False, **options):
+    """
+    Build the configured vector store. Every backend exposes the subset of the
+    Chroma client API the server uses (create_collection, get_collection,
+    delete_collection, list_collections) and returns Chroma-like collections.
+
+    backend is "chroma_http" (hosted Chroma), "chroma_persistent" (on-disk
+    Chroma, as in check_chromadb.py) or "local" (in-process NumPy/HNSW).
+    With lazy, chromadb is imported and the client connected on first use.
+    """
+    if lazy:
+        return LazyVectorStore(backend, **options)
+    if backend == "local":
+        return LocalVectorStore(options["path"])
+
+    import chromadb
+    if backend == "chroma_persistent":
+        return chromadb.PersistentClient(path=options["path"])
+    if backend == "chroma_http":
+        return chromadb.HttpClient(
+            ssl=True,
+            host=options["host"],
+            tenant=options["tenant"],
+            database=options["database"],
+            headers={
+                'x-chroma-token': options["token"],
+            }
+        )
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+class LazyVectorStore:
+    """Defers create_vector_store until the first attribute access."""
+
+    def __init__(self, backend, **options):
+        self._backend = backend
+        self._options = options
+        self._store = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = create_vector_store(self._backend, **self._options)
+        return getattr(self._store, name)
+
+
+def _conditions(where):
+    """(key, allowed values) pairs for the small part of Chroma's where syntax we use ($in and equality)."""
+    for key, condition in where.items():
+        if not isinstance(condition, dict):
+            yield key, (condition,)
+            continue
+        if "$in" in condition:
+            yield key, condition["$in"]
+        if "$eq" in condition:
+            yield key, (condition["$eq"],)
+
+
+class LocalCollection:
+    """
+    A collection kept in the worker process.
+
+    Vectors are unit-normalised and appended to a raw float32 file that is
+    memory-mapped for search; ids, documents and metadata are appended to a
+    JSON-lines file. Deletes are written as tombstones and metadata updates
+    as later records for the same id. Distances are cosine
+    distances (1 - similarity). Metadata values are indexed (key -> value
+    -> positions) as records are read, so where filters are lookups.
+
+    The records file is the commit log: a record exists once its line,
+    newline included, is on disk, and its vector row is written (and
+    synced) before it. Writers from every process take a lock file and
+    cut off what a crashed writer left past the last complete record
+    before appending. Every call first reads whatever other processes have
+    appended since (one stat when nothing has), so all workers see the
+    same collection.
+    """
+
+    def __init__(self, path, name):
+        self.name = name
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+        with self._lock:
+            self._refresh()
+
+    def _reset(self):
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._positions = {}
+        self._by_metadata = defaultdict(lambda: defaultdict(set))
+        self._deleted = set()
+        self._dim = None
+        self._vectors = None
+        self._index = None
+        # Bytes of the records file applied so far, and which file that was
+        self._offset = 0
+        self._inode = None
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _records_path(self):
+        return os.path.join(self.path, "records.jsonl")
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.path, "hnsw.bin")
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        # Serialises writers across processes; the caller holds self._lock
+        with open(os.path.join(self.path, "write.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._refresh()
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Apply records other processes appended since we last looked."""
+        try:
+            stat = os.stat(self._records_path)
+        except FileNotFoundError:
+            # Deleted (or not written to yet)
+            if self._offset:
+                self._reset()
+            return
+        if self._inode is not None and (stat.st_ino != self._inode or stat.st_size < self._offset):
+            self._reset()
+        self._inode = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+        with open(self._records_path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        # A line without its newline is still being written, or was torn by a crash
+        self._consume(data[:data.rfind(b"\n") + 1])
+
+    def _consume(self, data):
+        first = len(self._ids)
+        for line in data.splitlines():
+            record = json.loads(line)
+            if record.get("deleted"):
+                position = self._positions[record["id"]]
+                self._deleted.add(position)
+                if self._index is not None:
+                    self._index.mark_deleted(position)
+                continue
+            if record.get("updated"):
+                position = self._positions[record["id"]]
+                self._index_metadata(position, self._metadatas[position], remove=True)
+                self._metadatas[position] = record["metadata"]
+                self._index_metadata(position, record["metadata"])
+                continue
+            self._positions[record["id"]] = len(self._ids)
+            self._index_metadata(len(self._ids), record["metadata"])
+            self._ids.append(record["id"])
+            self._documents.append(record["document"])
+            self._metadatas.append(record["metadata"])
+            self._dim = record.get("dim", self._dim)
+        self._offset += len(data)
+        if len(self._ids) > first:
+            self._map_vectors()
+            if self._index is not None:
+                self._index.resize_index(len(self._ids))
+                self._index.add_items(np.asarray(self._vectors[first:]), np.arange(first, len(self._ids)))
+
+    def _index_metadata(self, position, metadata, remove=False):
+        for key, value in (metadata or {}).items():
+            if isinstance(value, (list, dict)):
+                continue
+            positions = self._by_metadata[key][value]
+            if remove:
+                positions.discard(position)
+            else:
+                positions.add(position)
+
+    def _where(self, where):
+        """Positions (live or not) whose metadata matches where."""
+        found = None
+        for key, values in _conditions(where):
+            by_value = self._by_metadata.get(key, {})
+            matching = set()
+            for value in values:
+                matching |= by_value.get(value, set())
+            found = matching if found is None else found & matching
+        return found if found is not None else set(range(len(self._ids)))
+
+    def _append(self, records, vectors=None):
+        """Commit records (and the vectors of the new ones, in order) to disk; hold _write_lock."""
+        if not records:
+            return
+        if vectors is not None:
+            with open(self._vectors_path, "ab") as f:
+                # Rows past the last record belong to a writer that crashed
+                f.truncate(len(self._ids) * self._dim * 4)
+                f.write(vectors.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        with open(self._records_path, "ab") as f:
+            f.truncate(self._offset)
+            f.write(data)
+        self._inode = os.stat(self._records_path).st_ino
+        self._consume(data)
+
+    def _map_vectors(self):
+        if self._ids and self._dim:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r",
+                                      shape=(len(self._ids), self._dim))
+
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._ids) - len(self._deleted)
+
+    def add(self, ids, embeddings, documents=None, metadatas=None):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.where(norms == 0, 1, norms)
+        documents = documents or [None] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+
+        with self._lock, self._write_lock():
+            fresh = [i for i, id_ in enumerate(ids) if id_ not in self._positions or self._positions[id_] in self._deleted]
+            if len(fresh) < len(ids):
+                logging.warning(f"{self.name}: skipping {len(ids) - len(fresh)} ids that already exist")
+            if not fresh:
+                return
+            self._dim = self._dim or embeddings.shape[1]
+            self._append(
+                [{"id": ids[i], "document": documents[i], "metadata": metadatas[i], "dim": self._dim}
+                 for i in fresh],
+                embeddings[fresh],
+            )
+            if self._index is not None:
+                self._index.save_index(self._index_path)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        """add(), replacing any live records that already have these ids."""
+        with self._lock:
+            self._refresh()
+            existing = [id_ for id_ in ids if id_ in self._positions]
+        self.delete(existing)
+        self.add(ids, embeddings, documents, metadatas)
+
+    def update(self, ids, metadatas):
+        """Replace the metadata of live ids, leaving their vectors and documents alone."""
+        with self._lock, self._write_lock():
+            self._append([
+                {"id": id_, "metadata": metadata, "updated": True}
+                for id_, metadata in zip(ids, metadatas)
+                if id_ in self._positions and self._positions[id_] not in self._deleted
+            ])
+
+    def delete(self, ids):
+        with self._lock, self._write_lock():
+            live = {id_ for id_ in ids if id_ in self._positions and self._positions[id_] not in self._deleted}
+            self._append([{"id": id_, "deleted": True} for id_ in live])
+
+    def _rows(self, positions, include):
+        result = {"ids": [self._ids[p] for p in positions]}
+        if "documents" in include:
+            result["documents"] = [self._documents[p] for p in positions]
+        if "metadatas" in include:
+            result["metadatas"] = [self._metadatas[p] for p in positions]
+        return result
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas"), limit=None, offset=0):
+        with self._lock:
+            self._refresh()
+            if ids is not None:
+                positions = [self._positions[id_] for id_ in ids if id_ in self._positions]
+                if where is not None:
+                    matching = self._where(where)
+                    positions = [p for p in positions if p in matching]
+            elif where is not None:
+                positions = sorted(self._where(where))
+            else:
+                positions = range(len(self._ids))
+            positions = [p for p in positions if p not in self._deleted]
+            end = None if limit is None else offset + limit
+            return self._rows(positions[offset:end], include)
+
+    def _ensure_index(self):
+        if self._index is not None or len(self._ids) < HNSW_MIN_VECTORS:
+            return self._index
+        try:
+            import hnswlib
+        except ImportError:
+            return None
+        index = None
+        if os.path.exists(self._index_path):
+            index = hnswlib.Index(space="ip", dim=self._dim)
+            index.load_index(self._index_path, max_elements=len(self._ids))
+            if index.get_current_count() != len(self._ids):
+                index = None
+        if index is None:
+            index = hnswlib.Index(space="ip", dim=self._dim)
+            index.init_index(max_elements=len(self._ids), ef_construction=200, M=16)
+            index.add_items(np.asarray(self._vectors), np.arange(len(self._ids)))
+            for position in self._deleted:
+                index.mark_deleted(position)
+            index.save_index(self._index_path)
+        index.set_ef(64)
+        self._index = index
+        return index
+
+    def query(self, query_embeddings, n_results=10, where=None, include=("documents", "metadatas", "distances")):
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self._lock:
+            self._refresh()
+            live = len(self._ids) - len(self._deleted)
+            k = min(n_results, live)
+            index = self._ensure_index() if where is None else None
+            for query in queries:
+                if k == 0:
+                    positions, scores = [], []
+                elif index is not None:
+                    labels, distances = index.knn_query(query, k=k)
+                    positions, scores = labels[0].tolist(), (1 - distances[0]).tolist()
+                else:
+                    similarity = np.asarray(self._vectors @ query)
+                    mask = np.ones(len(self._ids), dtype=bool)
+                    if self._deleted:
+                        mask[list(self._deleted)] = False
+                    if where is not None:
+                        matching = np.zeros(len(self._ids), dtype=bool)
+                        matching[list(self._where(where))] = True
+                        mask &= matching
+                    similarity = np.where(mask, similarity, -np.inf)
+                    top = min(k, int(mask.sum()))
+                    positions = np.argpartition(-similarity, top - 1)[:top] if top else np.array([], dtype=int)
+                    positions = positions[np.argsort(-similarity[positions])].tolist()
+                    scores = similarity[positions].tolist()
+
+                rows = self._rows(positions, include)
+                for key in ("ids", "documents", "metadatas"):
+                    if key in rows:
+                        result[key].append(rows[key])
+                result["distances"].append([1 - score for score in scores])
+        return result
+
+
+class LocalVectorStore:
+    """In-process vector store: one LocalCollection directory per collection under path."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _collection_path(self, name):
+        return os.path.join(self.path, name)
+
+    def create_collection(self, name, **kwargs):
+        with self._lock:
+            if os.path.exists(self._collection_path(name)):
+                raise ValueError(f"Collection {name} already exists")
+            os.makedirs(self._collection_path(name))
+            collection = self._collections[name] = LocalCollection(self._collection_path(name), name)
+            return collection
+
+    def get_collection(self, name, **kwargs):
+        with self._lock:
+            # Another worker may have deleted it since we opened it
+            if not os.path.isdir(self._collection_path(name)):
+                self._collections.pop(name, None)
+                raise ValueError(f"Collection {name} does not exist")
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = self._collections[name] = LocalCollection(self._collection_path(name), name)
+            return collection
+
+    def get_or_create_collection(self, name, **kwargs):
+        try:
+            return self.get_collection(name)
+        except ValueError:
+            return self.create_collection(name)
+
+    def delete_collection(self, name):
+        with self._lock:
+            self._collections.pop(name, None)
+            shutil.rmtree(self._collection_path(name), ignore_errors=True)
+
+    def list_collections(self):
+        return sorted(os.listdir(self.path))
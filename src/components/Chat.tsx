@@ -1,17 +1,55 @@
 "use client";
-import { useState, useRef, useEffect } from "react";
+import { useState, useRef, useEffect, useMemo } from "react";
 import { Input } from "@/components/ui/input";
 import { Paperclip, Loader2, Ellipsis } from "lucide-react";
 import { useToast } from "@/hooks/use-toast";
 import { Toaster } from "@/components/ui/toaster";
 import { cn } from "@/lib/utils";
 import axios from "axios";
+import { v4 as uuidv4 } from "uuid";
 import { Tab, TabGroup, TabList, TabPanel, TabPanels } from "@headlessui/react"; // Update this line
 import { useChat } from "@ai-sdk/react";
 import { GenerateCards } from "./GenerateCards";
 import Link from "next/link";
 import SimpleMarkdownRenderer from "./SimpleMarkdown";
 
+const server_url = "https://eda-server-production.up.railway.app";
+// const server_url = "http://127.0.0.1:5000";
+
+// /search/stream answers with server-sent events; useChat reads plain text
+async function fetchAnswerText(input: RequestInfo | URL, init?: RequestInit) {
+  const response = await fetch(input, init);
+  if (!response.ok || !response.body) {
+    return response;
+  }
+  let buffer = "";
+  const tokens = new TransformStream<string, string>({
+    transform(chunk, controller) {
+      buffer += chunk;
+      const events = buffer.split("\n\n");
+      buffer = events.pop() ?? "";
+      for (const event of events) {
+        const lines = event.split("\n");
+        const name = lines.find((line) => line.startsWith("event: "))?.slice(7);
+        const data = lines.find((line) => line.startsWith("data: "))?.slice(6);
+        if (!data) continue;
+        if (name === "error") {
+          controller.error(new Error(JSON.parse(data).error));
+        } else if (!name) {
+          controller.enqueue(JSON.parse(data).token);
+        }
+      }
+    },
+  });
+  return new Response(
+    response.body
+      .pipeThrough(new TextDecoderStream())
+      .pipeThrough(tokens)
+      .pipeThrough(new TextEncoderStream()),
+    { status: response.status, headers: response.headers }
+  );
+}
+
 export default function Chat({ chatId }: { chatId: string }) {
   const [isInitialUploadDone, setIsInitialUploadDone] = useState(false);
   const [isUploading, setIsUploading] = useState(false);
@@ -19,15 +57,22 @@ export default function Chat({ chatId }: { chatId: string }) {
   const [attachmentUrl, setAttachmentUrl] = useState<string | null>(null);
   const [uploadedFileName, setUploadedFileName] = useState<string>("");
   const fileInputRef = useRef<HTMLInputElement>(null);
-  const [document, setDocument] = useState<string>("");
   const { toast } = useToast();
+  // New for every conversation, so the server keeps its history apart
+  const sessionId = useMemo(() => uuidv4(), [chatId]);
 
   const bottomRef = useRef<HTMLDivElement>(null);
   const { messages, input, handleInputChange, handleSubmit, status, isLoading } =
     useChat({
-      body: {
-        document: document,
-      },
+      api: `${server_url}/search/stream`,
+      streamProtocol: "text",
+      fetch: fetchAnswerText,
+      // The upload was stored under chatId, so that's the document to search
+      experimental_prepareRequestBody: ({ messages }) => ({
+        text: messages[messages.length - 1].content,
+        document_id: chatId,
+        session_id: sessionId,
+      }),
     });
 
   useEffect(() => {
@@ -61,8 +106,7 @@ export default function Chat({ chatId }: { chatId: string }) {
 
       try {
         const response = await axios.post(
-          "https://eda-server-production.up.railway.app/upload",
-          // "http://127.0.0.1:5000/upload",
+          `${server_url}/upload`,
           formData,
           {
             headers: {
@@ -70,17 +114,27 @@ export default function Chat({ chatId }: { chatId: string }) {
             },
           }
         );
+
+        // The server processes the file in the background; poll until it's done
+        let job = (await axios.get(`${server_url}${response.data.status_url}`)).data;
+        while (job.status === "queued" || job.status === "running") {
+          await new Promise((resolve) => setTimeout(resolve, 1000));
+          job = (await axios.get(`${server_url}${response.data.status_url}`)).data;
+        }
+        if (job.status !== "done") {
+          throw { response: { data: { error: job.error } } };
+        }
+
         setAttachment(file);
         setAttachmentUrl(URL.createObjectURL(file));
         setIsInitialUploadDone(true);
         setUploadedFileName(file.name);
-        setDocument(response.data.document);
         toast({
           className: cn(
             "top-0 right-0 flex fixed md:max-w-[420px] md:top-4 md:right-4 bg-orange-700 text-white"
           ),
           title: "File uploaded",
-          description: response.data.message,
+          description: job.result.message,
         });
       } catch (error: any) {
         toast({